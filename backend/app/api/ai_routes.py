@@ -2,18 +2,29 @@
 AI路线规划API端点
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
+import asyncio
 import logging
 import time
+from contextlib import aclosing
 
-from ..services.llm_service import llm_service, LocationInfo, RouteVisualization
+import orjson
+
+from ..services.llm_service import LLMService, LocationInfo, RouteVisualization, get_llm_service
+from ..services.llm_batcher import BatchedLLMClient, get_batched_llm_client
+from ..config import get_config
+from .routes import HEALTH_CACHE_MAX_AGE
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1/ai", tags=["AI路线规划"])
 
+# 限制单个进程内同时进行的LLM请求数，避免突发流量压垮上游服务
+_llm_semaphore = asyncio.Semaphore(get_config().get_limits().llm_concurrency)
+
 
 class RouteRequest(BaseModel):
     """路线规划请求模型"""
@@ -32,7 +43,10 @@ class RouteResponse(BaseModel):
 
 
 @router.post("/parse-locations", response_model=RouteResponse)
-async def parse_locations(request: RouteRequest):
+async def parse_locations(
+    request: RouteRequest,
+    batched_llm_client: BatchedLLMClient = Depends(get_batched_llm_client)
+):
     """
     解析用户输入中的地点信息
     
@@ -42,21 +56,21 @@ async def parse_locations(request: RouteRequest):
     Returns:
         解析结果，包含识别的地点信息
     """
-    import time
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     try:
-        logger.info(f"开始解析地点: {request.user_input[:100]}...")
+        logger.info("开始解析地点: %.100s...", request.user_input)
         
-        # 调用LLM服务解析地点
-        locations = await llm_service.parse_locations(request.user_input)
+        # 调用LLM服务解析地点（与并发请求合并批处理）
+        async with _llm_semaphore:
+            locations = await batched_llm_client.parse(request.user_input)
         
         # 检查地点数量限制
         if len(locations) > request.max_locations:
             locations = locations[:request.max_locations]
-            logger.warning(f"地点数量超限，截取前{request.max_locations}个")
+            logger.warning("地点数量超限，截取前%d个", request.max_locations)
         
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
         
         return RouteResponse(
             success=True,
@@ -66,8 +80,8 @@ async def parse_locations(request: RouteRequest):
         )
         
     except Exception as e:
-        processing_time = time.time() - start_time
-        logger.error(f"地点解析失败: {e}")
+        processing_time = time.perf_counter() - start_time
+        logger.error("地点解析失败: %s", e)
         
         raise HTTPException(
             status_code=500,
@@ -76,7 +90,10 @@ async def parse_locations(request: RouteRequest):
 
 
 @router.post("/generate-route", response_model=RouteResponse)
-async def generate_route(request: RouteRequest):
+async def generate_route(
+    request: RouteRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """
     生成完整的AI路线规划
     
@@ -86,14 +103,17 @@ async def generate_route(request: RouteRequest):
     Returns:
         完整的路线规划结果
     """
-    import time
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     try:
-        logger.info(f"开始生成路线: {request.user_input[:100]}...")
+        logger.info("开始生成路线: %.100s...", request.user_input)
         
-        # 第一步：解析地点
-        locations = await llm_service.parse_locations(request.user_input)
+        # 地点解析和路线生成合并为一次LLM调用
+        async with _llm_semaphore:
+            locations, route = await llm_service.plan_route(
+                request.user_input,
+                max_locations=request.max_locations
+            )
         
         if not locations:
             raise HTTPException(
@@ -101,15 +121,7 @@ async def generate_route(request: RouteRequest):
                 detail="未能识别到有效地点，请检查输入内容"
             )
         
-        # 检查地点数量限制
-        if len(locations) > request.max_locations:
-            locations = locations[:request.max_locations]
-            logger.warning(f"地点数量超限，截取前{request.max_locations}个")
-        
-        # 第二步：生成路线
-        route = await llm_service.generate_route(locations)
-        
-        processing_time = time.time() - start_time
+        processing_time = time.perf_counter() - start_time
         
         return RouteResponse(
             success=True,
@@ -122,8 +134,8 @@ async def generate_route(request: RouteRequest):
     except HTTPException:
         raise
     except Exception as e:
-        processing_time = time.time() - start_time
-        logger.error(f"路线生成失败: {e}")
+        processing_time = time.perf_counter() - start_time
+        logger.error("路线生成失败: %s", e)
         
         raise HTTPException(
             status_code=500,
@@ -131,8 +143,75 @@ async def generate_route(request: RouteRequest):
         )
 
 
+def _ndjson_event(event: str, **payload) -> bytes:
+    """编码一条NDJSON事件"""
+    return orjson.dumps({"event": event, **payload}) + b"\n"
+
+
+@router.post("/generate-route/stream")
+async def generate_route_stream(
+    request: RouteRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    以NDJSON流式返回AI路线规划
+    
+    LLM每识别出一个地点即推送 location 事件，之后依次推送 locations、route、done 事件，
+    客户端在首个地点返回后即可开始渲染，无需等待路线生成结束。出错时推送 error 事件并结束流。
+    
+    Args:
+        request: 包含用户输入的请求
+        
+    Returns:
+        application/x-ndjson 流式响应
+    """
+    async def event_stream() -> AsyncIterator[bytes]:
+        start_time = time.perf_counter()
+        
+        try:
+            logger.info("开始流式生成路线: %.100s...", request.user_input)
+            
+            # 第一步：流式解析地点，每识别出一个立即推送
+            locations = []
+            async with aclosing(llm_service.parse_locations_stream(request.user_input)) as stream:
+                while True:
+                    # 只在等待上游产出时占用LLM并发名额，推送期间释放，读取缓慢的客户端不会长期占用名额
+                    async with _llm_semaphore:
+                        location = await anext(stream, None)
+                    if location is None:
+                        break
+                    if len(locations) >= request.max_locations:
+                        logger.warning("地点数量超限，截取前%d个", request.max_locations)
+                        break
+                    locations.append(location)
+                    yield _ndjson_event("location", data=location.model_dump())
+            
+            if not locations:
+                yield _ndjson_event("error", message="未能识别到有效地点，请检查输入内容")
+                return
+            
+            yield _ndjson_event("locations", data=[loc.model_dump() for loc in locations])
+            
+            # 第二步：生成路线
+            async with _llm_semaphore:
+                route = await llm_service.generate_route(locations)
+            yield _ndjson_event("route", data=route.model_dump())
+            
+            yield _ndjson_event(
+                "done",
+                message=f"成功生成包含{len(locations)}个地点的路线",
+                processing_time=time.perf_counter() - start_time
+            )
+            
+        except Exception as e:
+            logger.error("流式路线生成失败: %s", e)
+            yield _ndjson_event("error", message=f"路线生成失败: {str(e)}")
+    
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
 @router.get("/health")
-async def health_check():
+async def health_check(response: Response):
     """
     健康检查端点
     
@@ -140,7 +219,8 @@ async def health_check():
         服务状态信息
     """
     try:
-        # 检查LLM服务状态
+        # 检查LLM服务状态，配置加载失败时在此抛出
+        llm_service = get_llm_service()
         if not llm_service.config:
             return {
                 "status": "unhealthy",
@@ -148,6 +228,8 @@ async def health_check():
                 "timestamp": time.time()
             }
         
+        # 只允许缓存健康结果，异常状态需要客户端每次重新检查
+        response.headers["Cache-Control"] = f"public, max-age={HEALTH_CACHE_MAX_AGE}"
         return {
             "status": "healthy",
             "message": "AI路线规划服务正常",
@@ -156,7 +238,7 @@ async def health_check():
         }
         
     except Exception as e:
-        logger.error(f"健康检查失败: {e}")
+        logger.error("健康检查失败: %s", e)
         return {
             "status": "unhealthy",
             "message": f"服务异常: {str(e)}",
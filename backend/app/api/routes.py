@@ -1,5 +1,7 @@
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+import ormsgpack
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from app.models import (
     LocationParseRequest, 
     LocationParseResponse, 
@@ -8,17 +10,45 @@ from app.models import (
     RouteGenerateResponse
 )
 from app.services import LocationParser
+from app.services.location_parser import close_location_parser, get_location_parser as get_shared_location_parser
 from app.services.route_generator import RouteGenerator
-from app.config import config
+from app.config import get_config
+from app.utils.cache import TTLCache
 
 router = APIRouter()
 
-# 全局服务实例
-location_parser = LocationParser()
-route_generator = RouteGenerator()
+# 服务实例，首次请求时创建
+_route_generator: Optional[RouteGenerator] = None
+
+# 输入建议缓存，同一输入文本在有效期内直接返回
+_suggestion_cache = TTLCache(maxsize=4096, ttl=600)
+
+# 客户端可通过Accept头请求的二进制响应格式
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# 健康检查响应允许客户端和代理缓存的时间（秒）
+HEALTH_CACHE_MAX_AGE = 10
+
+async def get_location_parser() -> LocationParser:
+    """获取地名解析服务实例，与LLM服务共用全局实例"""
+    return get_shared_location_parser()
+
+async def get_route_generator() -> RouteGenerator:
+    """获取路线生成服务实例"""
+    global _route_generator
+    if _route_generator is None:
+        _route_generator = RouteGenerator()
+    return _route_generator
+
+async def close_services():
+    """释放服务实例持有的连接"""
+    await close_location_parser()
 
 @router.post("/parse", response_model=LocationParseResponse)
-async def parse_locations(request: LocationParseRequest):
+async def parse_locations(
+    request: LocationParseRequest,
+    location_parser: LocationParser = Depends(get_location_parser)
+):
     """
     解析地名接口
     
@@ -42,23 +72,38 @@ async def parse_locations(request: LocationParseRequest):
         )
 
 @router.post("/generate-route", response_model=RouteGenerateResponse)
-async def generate_route(request: RouteGenerateRequest):
+async def generate_route(
+    request: RouteGenerateRequest,
+    http_request: Request,
+    packed: bool = Query(False, description="以列式packedPath返回路径点"),
+    route_generator: RouteGenerator = Depends(get_route_generator)
+):
     """
     生成路线接口
     
     - **coordinates**: 地点坐标列表，至少2个坐标点
+    - **packed**: 为true时路径点以列式packedPath返回，pathPoints为空
     - 返回路线数据，包括路径点、地图边界、标签位置等
+    - 请求头Accept包含application/msgpack时以MessagePack编码返回
     """
     try:
-        route_data = await route_generator.generate_route(request.coordinates)
+        route_data = await route_generator.generate_route(request.coordinates, packed=packed)
         
-        return RouteGenerateResponse(
+        response = RouteGenerateResponse(
             success=True,
             data=route_data,
             message="路线生成成功",
             code=200
         )
         
+        if MSGPACK_MEDIA_TYPE in http_request.headers.get("accept", ""):
+            return Response(
+                content=ormsgpack.packb(response.model_dump(mode="json")),
+                media_type=MSGPACK_MEDIA_TYPE
+            )
+        
+        return response
+        
     except ValueError as e:
         raise HTTPException(
             status_code=400,
@@ -71,21 +116,21 @@ async def generate_route(request: RouteGenerateRequest):
         )
 
 @router.get("/health", response_model=HealthCheckResponse)
-async def health_check():
+async def health_check(response: Response):
     """
     健康检查接口
     
     返回服务状态和版本信息
     """
-    app_config = config.get_app_config()
-    amap_config = config.get_amap_config()
+    config = get_config()
+    response.headers["Cache-Control"] = f"public, max-age={HEALTH_CACHE_MAX_AGE}"
     
     # 检查高德地图API配置
-    amap_status = "configured" if amap_config.get('api_key') else "not_configured"
+    amap_status = "configured" if config.amap.api_key else "not_configured"
     
     return HealthCheckResponse(
         status="healthy",
-        version=app_config.get('version', '1.0.0'),
+        version=config.app.version,
         timestamp=datetime.now().isoformat(),
         dependencies={
             "amap_api": amap_status,
@@ -94,7 +139,10 @@ async def health_check():
     )
 
 @router.get("/suggest/{input_text}")
-async def suggest_corrections(input_text: str):
+async def suggest_corrections(
+    input_text: str,
+    location_parser: LocationParser = Depends(get_location_parser)
+):
     """
     获取输入建议接口
     
@@ -102,7 +150,10 @@ async def suggest_corrections(input_text: str):
     - 返回修正建议列表
     """
     try:
-        suggestions = await location_parser.suggest_corrections(input_text)
+        suggestions = _suggestion_cache.get(input_text)
+        if suggestions is None:
+            suggestions = await location_parser.suggest_corrections(input_text)
+            _suggestion_cache.set(input_text, suggestions)
         
         return {
             "success": True,
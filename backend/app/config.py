@@ -1,7 +1,52 @@
-import json
 import os
+from dataclasses import dataclass, fields
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+import orjson
+
+@dataclass(frozen=True, slots=True)
+class AmapConfig:
+    """高德地图配置"""
+    api_key: Optional[str] = None
+    security_key: Optional[str] = None
+    base_url: Optional[str] = None
+
+@dataclass(frozen=True, slots=True)
+class AppConfig:
+    """应用配置"""
+    title: str = 'Travel Route Map API'
+    version: str = '1.0.0'
+    debug: bool = True
+    host: str = '0.0.0.0'
+    port: int = 8000
+    timeout_keep_alive: int = 30
+    workers: int = 1
+    backlog: int = 2048
+
+@dataclass(frozen=True, slots=True)
+class LimitsConfig:
+    """限制配置"""
+    min_locations: int = 1
+    max_locations: int = 20
+    daily_api_calls: int = 10000
+    max_body_bytes: int = 16384
+    llm_concurrency: int = 16
+    geocode_concurrency: int = 8
+    geocode_qps: int = 20
+    geocode_max_retries: int = 3
+
+@dataclass(frozen=True, slots=True)
+class CacheConfig:
+    """缓存配置"""
+    ttl_seconds: int = 86400
+    max_size: int = 1000
+
+def _build_section(cls, data: Any):
+    """从配置节字典构建配置对象，忽略未知字段"""
+    if not isinstance(data, dict):
+        data = {}
+    return cls(**{f.name: data[f.name] for f in fields(cls) if f.name in data})
 
 class Config:
     """配置管理类，从JSON文件加载配置"""
@@ -13,17 +58,26 @@ class Config:
         
         self.config_path = Path(config_path)
         self._config: Dict[str, Any] = {}
+        self.amap = AmapConfig()
+        self.app = AppConfig()
+        self.limits = LimitsConfig()
+        self.cache = CacheConfig()
         self.load_config()
     
     def load_config(self):
         """加载配置文件"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                self._config = json.load(f)
+            self._config = orjson.loads(self.config_path.read_bytes())
         except FileNotFoundError:
             raise FileNotFoundError(f"配置文件未找到: {self.config_path}")
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             raise ValueError(f"配置文件格式错误: {e}")
+        
+        # 加载时一次性构建各配置节，避免每次请求重复遍历字典
+        self.amap = _build_section(AmapConfig, self._config.get('amap'))
+        self.app = _build_section(AppConfig, self._config.get('app'))
+        self.limits = _build_section(LimitsConfig, self._config.get('limits'))
+        self.cache = _build_section(CacheConfig, self._config.get('cache'))
     
     def get(self, key: str, default: Any = None) -> Any:
         """获取配置值，支持点号分隔的嵌套键"""
@@ -38,31 +92,23 @@ class Config:
         
         return value
     
-    def get_amap_config(self) -> Dict[str, str]:
+    def get_amap_config(self) -> AmapConfig:
         """获取高德地图配置"""
-        return {
-            'api_key': self.get('amap.api_key'),
-            'security_key': self.get('amap.security_key'),
-            'base_url': self.get('amap.base_url')
-        }
+        return self.amap
     
-    def get_app_config(self) -> Dict[str, Any]:
+    def get_app_config(self) -> AppConfig:
         """获取应用配置"""
-        return {
-            'title': self.get('app.title'),
-            'version': self.get('app.version'),
-            'debug': self.get('app.debug'),
-            'host': self.get('app.host'),
-            'port': self.get('app.port')
-        }
+        return self.app
     
-    def get_limits(self) -> Dict[str, int]:
+    def get_limits(self) -> LimitsConfig:
         """获取限制配置"""
-        return {
-            'min_locations': self.get('limits.min_locations'),
-            'max_locations': self.get('limits.max_locations'),
-            'daily_api_calls': self.get('limits.daily_api_calls')
-        }
+        return self.limits
+    
+    def get_cache_config(self) -> CacheConfig:
+        """获取缓存配置"""
+        return self.cache
 
-# 全局配置实例
-config = Config()
\ No newline at end of file
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """获取全局配置实例，首次调用时加载并缓存"""
+    return Config()
\ No newline at end of file
@@ -1,12 +1,34 @@
-from typing import List, Optional, Literal
-from pydantic import BaseModel, Field, field_validator
+from enum import Enum
+from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+class AdminLevel(str, Enum):
+    """行政级别"""
+    PROVINCE = 'province'
+    CITY = 'city'
+    DISTRICT = 'district'
+
+class PathPointType(str, Enum):
+    """路径点类型"""
+    START = 'start'
+    END = 'end'
+    CONTROL = 'control'
+
+class LabelSide(str, Enum):
+    """标签相对位置"""
+    TOP = 'top'
+    BOTTOM = 'bottom'
+    LEFT = 'left'
+    RIGHT = 'right'
 
 class Coordinate(BaseModel):
     """地理坐标模型"""
+    model_config = ConfigDict(frozen=True)
+    
     lng: float = Field(..., description="经度")
     lat: float = Field(..., description="纬度")
     name: str = Field(..., description="标准地名")
-    level: Literal['province', 'city', 'district'] = Field(..., description="行政级别")
+    level: AdminLevel = Field(..., description="行政级别")
 
 class ParseResult(BaseModel):
     """地名解析结果模型"""
@@ -52,29 +74,43 @@ class HealthCheckResponse(BaseModel):
 
 class PathPoint(BaseModel):
     """路径点模型"""
+    model_config = ConfigDict(frozen=True)
+    
     lng: float = Field(..., description="经度")
     lat: float = Field(..., description="纬度")
-    type: Literal['start', 'end', 'control'] = Field(..., description="路径点类型")
+    type: PathPointType = Field(..., description="路径点类型")
     index: int = Field(..., description="在路径中的索引")
 
+class PackedPath(BaseModel):
+    """列式存储的路径点，第i个点由各数组的第i项组成"""
+    lng: List[float] = Field(default_factory=list, description="经度数组")
+    lat: List[float] = Field(default_factory=list, description="纬度数组")
+    type: List[PathPointType] = Field(default_factory=list, description="路径点类型数组")
+    index: List[int] = Field(default_factory=list, description="路径索引数组")
+
 class MapBounds(BaseModel):
     """地图边界模型"""
+    model_config = ConfigDict(frozen=True)
+    
     southwest: Coordinate = Field(..., description="西南角坐标")
     northeast: Coordinate = Field(..., description="东北角坐标")
 
 class LabelPosition(BaseModel):
     """标签位置模型"""
+    model_config = ConfigDict(frozen=True)
+    
     lng: float = Field(..., description="标签经度")
     lat: float = Field(..., description="标签纬度")
     name: str = Field(..., description="标签名称")
     offset_x: float = Field(default=0, description="X轴偏移量")
     offset_y: float = Field(default=0, description="Y轴偏移量")
-    position: Literal['top', 'bottom', 'left', 'right'] = Field(default='top', description="标签相对位置")
+    position: LabelSide = Field(default=LabelSide.TOP, description="标签相对位置")
 
 class RouteData(BaseModel):
     """路线数据模型"""
     coordinates: List[Coordinate] = Field(..., description="地点坐标列表")
     pathPoints: List[PathPoint] = Field(default_factory=list, description="路径点数据")
+    packedPath: Optional[PackedPath] = Field(None, description="列式路径点数据，请求packed时代替pathPoints返回")
     bounds: MapBounds = Field(..., description="地图边界")
     center: Coordinate = Field(..., description="地图中心点")
     zoom: float = Field(..., description="缩放级别")
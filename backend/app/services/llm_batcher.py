@@ -0,0 +1,161 @@
+"""
+LLM请求批处理
+将短时间窗口内到达的地点解析请求合并为一次LLM调用，再把结果分发回各个请求
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from .llm_service import LLMService, LocationInfo, get_llm_service
+
+logger = logging.getLogger(__name__)
+
+
+class BatchedLLMClient:
+    """LLM批处理客户端"""
+
+    def __init__(self, service: LLMService, max_batch_size: int = 8, max_wait_ms: int = 20):
+        """
+        初始化批处理客户端
+
+        Args:
+            service: 实际执行LLM调用的服务
+            max_batch_size: 单批最多合并的请求数
+            max_wait_ms: 收集一批请求的最长等待时间（毫秒）
+        """
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatching: Set[asyncio.Task] = set()
+        # 进行中的请求，相同输入的并发请求共享同一次解析结果
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def parse(self, user_input: str) -> List[LocationInfo]:
+        """
+        解析用户输入中的地点信息，与同一时间窗口内的其他请求合并执行
+
+        Args:
+            user_input: 用户输入的文本
+
+        Returns:
+            解析出的地点信息列表
+        """
+        if not user_input or not user_input.strip():
+            raise ValueError("用户输入不能为空")
+
+        self._ensure_worker()
+
+        key = user_input.strip()
+        future = self._inflight.get(key)
+        if future is None:
+            future = self._loop.create_future()
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._release(key, f))
+            await self._queue.put((user_input, future))
+        else:
+            logger.debug("复用进行中的地点解析请求")
+
+        # 单个调用方被取消时不影响共享同一结果的其他请求
+        return await asyncio.shield(future)
+
+    def _release(self, key: str, future: asyncio.Future):
+        """请求完成后移出进行中映射"""
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def _ensure_worker(self):
+        """在当前事件循环中按需启动批处理后台任务"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker and not self._worker.done():
+            return
+
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._inflight = {}
+        self._worker = loop.create_task(self._run())
+
+    async def _run(self):
+        """收集请求并按批次分发"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # 分发在独立任务中执行，不阻塞下一批请求的收集
+            task = self._loop.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        """执行一次批量LLM调用并回填各请求结果"""
+        user_inputs = [user_input for user_input, _ in batch]
+
+        if len(batch) > 1:
+            logger.info("合并%d个地点解析请求为一次LLM调用", len(batch))
+
+        try:
+            results = await self.service.parse_locations_batch(user_inputs)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), locations in zip(batch, results):
+            if not future.done():
+                future.set_result(locations)
+
+    async def aclose(self):
+        """停止批处理后台任务，尚未完成的请求以异常结束，避免调用方一直等待"""
+        tasks = list(self._dispatching)
+        if self._worker and not self._worker.done():
+            tasks.append(self._worker)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+        self._dispatching.clear()
+        
+        # 仍在队列中、已被取出但未分发以及分发被取消的请求都还在进行中映射里
+        for future in list(self._inflight.values()):
+            if not future.done():
+                future.set_exception(RuntimeError("LLM批处理客户端已关闭"))
+        
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+
+
+# 全局批处理客户端实例，首次使用时创建
+_batched_llm_client: Optional[BatchedLLMClient] = None
+
+
+def get_batched_llm_client() -> BatchedLLMClient:
+    """获取全局批处理客户端实例，首次调用时基于全局LLM服务创建"""
+    global _batched_llm_client
+    if _batched_llm_client is None:
+        service = get_llm_service()
+        _batched_llm_client = BatchedLLMClient(
+            service,
+            max_batch_size=service.config.batch_max_size,
+            max_wait_ms=service.config.batch_max_wait_ms
+        )
+    return _batched_llm_client
+
+
+async def close_batched_llm_client():
+    """停止已创建的全局批处理客户端"""
+    if _batched_llm_client is not None:
+        await _batched_llm_client.aclose()
@@ -3,21 +3,264 @@ LLM服务集成
 提供AI路线规划的核心功能，包括地点解析和路线生成
 """
 
-import os
 import yaml
 import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import re
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 
 import httpx
-from pydantic import BaseModel, Field
+import orjson
+from pydantic import BaseModel, Field, TypeAdapter
 
-from ..utils.config_validator import load_and_validate_config, ConfigValidationError
+from ..models import AdminLevel
+from ..utils.config_validator import ConfigValidationError
+from ..utils.cache import TTLCache
+from .location_parser import get_location_parser
 
 logger = logging.getLogger(__name__)
 
+# 系统提示词只包含静态内容且位于消息最前，用户相关内容全部放在最后的user消息中，
+# 使每次请求的前缀完全一致，便于LLM服务端命中前缀缓存
+DEFAULT_SYSTEM_PROMPT = "你是一个专业的地理信息和路线规划专家。"
+
+LOCATION_PARSING_SYSTEM_PROMPT = """你是一个专业的地理信息和路线规划专家。
+
+请从用户输入中识别所有提到的地点，并提供准确的地理信息。
+
+请识别并返回：
+1. 所有提到的城市、景点、地标
+2. 每个地点的准确名称和坐标
+3. 地点的类型分类
+4. 适合的显示名称
+
+要求：
+- 准确识别地点名称，包括中英文对照
+- 提供精确的经纬度坐标
+- 合理分类地点类型
+- 处理模糊或不完整的地名
+- 返回结构化的JSON数据
+
+输出格式：
+{
+  "locations": [
+    {
+      "name": "地点原名",
+      "display_name": "显示名称", 
+      "coordinates": [经度, 纬度],
+      "type": "city|attraction|landmark|natural",
+      "description": "简短描述"
+    }
+  ]
+}
+"""
+
+BATCH_LOCATION_PARSING_SYSTEM_PROMPT = """你是一个专业的地理信息和路线规划专家。
+
+请分别从多条编号的用户输入中识别所有提到的地点，并提供准确的地理信息。
+每条输入相互独立，不要混用不同输入中的地点。
+
+要求：
+- 准确识别地点名称，包括中英文对照
+- 提供精确的经纬度坐标
+- 合理分类地点类型
+- 处理模糊或不完整的地名
+- 每条输入都必须返回一项结果，index与输入编号一致
+
+请以JSON格式返回，输出格式：
+{
+  "results": [
+    {
+      "index": 0,
+      "locations": [
+        {
+          "name": "地点原名",
+          "display_name": "显示名称",
+          "coordinates": [经度, 纬度],
+          "type": "city|attraction|landmark|natural",
+          "description": "简短描述"
+        }
+      ]
+    }
+  ]
+}
+"""
+
+ROUTE_GENERATION_SYSTEM_PROMPT = """你是一个专业的地理信息和路线规划专家。
+
+请为用户给出的地点生成一个最优的旅行路线。
+
+要求：
+1. 生成地点之间的连接关系，包括距离和预估时长
+2. 考虑地理位置的合理性，优化路线顺序
+3. 提供地图边界框信息
+4. 推荐合适的视觉样式
+
+请以JSON格式返回结果，包含：
+- connections: 连接关系数组，每个包含from, to, distance(km), duration(分钟)
+- map_bounds: 地图边界，包含north, south, east, west
+- visual_style: 视觉样式，包含theme, color_scheme, line_style
+"""
+
+ROUTE_PLANNING_SYSTEM_PROMPT = """你是一个专业的地理信息和路线规划专家。
+
+请从用户输入中识别所有提到的地点，并直接为这些地点生成一个最优的旅行路线。
+
+要求：
+1. 准确识别地点名称，包括中英文对照，提供精确的经纬度坐标
+2. 合理分类地点类型，处理模糊或不完整的地名
+3. 按旅行顺序排列地点，生成相邻地点之间的连接关系，包括距离和预估时长
+4. 推荐合适的视觉样式
+
+请以JSON格式返回，输出格式：
+{
+  "locations": [
+    {
+      "name": "地点原名",
+      "display_name": "显示名称",
+      "coordinates": [经度, 纬度],
+      "type": "city|attraction|landmark|natural",
+      "description": "简短描述"
+    }
+  ],
+  "connections": [
+    {"from": "地点原名", "to": "地点原名", "distance": "距离(km)", "duration": "时长"}
+  ],
+  "visual_style": {"theme": "主题", "color_scheme": "配色", "line_style": "线型"}
+}
+"""
+
+
+# user消息中的固定片段
+_LOCATION_PROMPT_PREFIX = "用户输入："
+_ROUTE_PROMPT_LOCATIONS_HEADER = "地点列表：\n"
+_ROUTE_PROMPT_COORDINATES_HEADER = "\n\n地点坐标信息：\n"
+
+# 优先使用libyaml的C实现解析配置
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@lru_cache(maxsize=8)
+def _load_yaml(path: str, mtime: float) -> Dict[str, Any]:
+    """
+    解析YAML配置文件
+    
+    以路径和修改时间为缓存键，文件未修改时重复创建服务不再重新解析；
+    返回的字典在多个服务实例间共享，调用方只读不写
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+
+# LLM响应中包裹JSON的代码块起始标记
+_JSON_FENCE = "```json"
+
+# 扫描JSON对象边界时需要关注的字符
+_JSON_TOKEN_PATTERN = re.compile(r'[{}"\\]')
+
+# LLM API响应体超过该字节数时在线程中解码
+_THREADED_DECODE_THRESHOLD = 8192
+
+# 无需LLM即可处理的地名片段：2到6个汉字，整段输入由多个这样的片段以分隔符隔开
+_PLACE_NAME_TOKEN_PATTERN = re.compile(r'[\u4e00-\u9fff]{2,6}')
+
+# 无需LLM的地理编码解析总时限（秒），高德限流或故障时尽快改用LLM
+_RESOLVE_WITHOUT_LLM_TIMEOUT = 2.0
+
+
+def _extract_json_str(response: str) -> str:
+    """
+    提取LLM响应中的JSON文本
+    
+    LLM可能返回包含说明文字的响应：优先从```json代码块开始查找，否则从响应开头查找，
+    取第一个"{"到与之配对的"}"之间的内容。按括号深度线性扫描并跳过字符串内的括号，
+    不存在正则回溯；找不到完整的对象时返回剩余文本，交由JSON解析报错
+    """
+    fence = response.find(_JSON_FENCE)
+    offset = fence + len(_JSON_FENCE) if fence != -1 else 0
+    
+    start = response.find("{", offset)
+    if start == -1:
+        return response[offset:].strip()
+    
+    depth = 0
+    in_string = False
+    # 字符串内被反斜杠转义的字符位置
+    escaped_pos = -1
+    
+    # 只访问括号、引号和反斜杠，跳过其余普通字符
+    for match in _JSON_TOKEN_PATTERN.finditer(response, start):
+        pos = match.start()
+        if pos == escaped_pos:
+            continue
+        
+        char = match.group()
+        if in_string:
+            if char == "\\":
+                escaped_pos = pos + 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return response[start:pos + 1]
+    
+    return response[start:].strip()
+
+
+class _LocationItemScanner:
+    """
+    增量扫描流式返回的地点解析JSON，逐个取出locations数组中已完整的地点对象
+    
+    响应格式为{"locations": [{...}, ...]}，地点对象即第二层的花括号对象。
+    扫描状态跨片段保留，每个字符只扫描一次
+    """
+    
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped_pos = -1
+        self._item_start = -1
+    
+    def feed(self, chunk: str) -> List[str]:
+        """追加一段响应文本，返回其中新出现的完整地点对象文本"""
+        self._text += chunk
+        items = []
+        
+        for match in _JSON_TOKEN_PATTERN.finditer(self._text, self._pos):
+            pos = match.start()
+            if pos == self._escaped_pos:
+                continue
+            
+            char = match.group()
+            if self._in_string:
+                if char == "\\":
+                    self._escaped_pos = pos + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+                if self._depth == 2:
+                    self._item_start = pos
+            elif char == "}":
+                if self._depth == 2:
+                    items.append(self._text[self._item_start:pos + 1])
+                self._depth -= 1
+        
+        self._pos = len(self._text)
+        return items
+
 
 class LocationInfo(BaseModel):
     """地点信息模型"""
@@ -36,6 +279,10 @@ class RouteVisualization(BaseModel):
     visual_style: Dict[str, Any] = Field(..., description="视觉样式")
 
 
+# 地点列表校验器，模块加载时构建一次
+_LOCATION_LIST_ADAPTER = TypeAdapter(List[LocationInfo])
+
+
 class LLMConfig(BaseModel):
     """LLM配置模型"""
     api_key: str
@@ -44,15 +291,44 @@ class LLMConfig(BaseModel):
     max_tokens: int = 1000
     temperature: float = 0.3
     timeout: int = 30
+    batch_max_size: int = 8
+    batch_max_wait_ms: int = 20
+    cache_ttl: int = 3600
+    cache_max_size: int = 1024
+    trust_llm_output: bool = False
+    json_mode: bool = True
 
 
 class LLMService:
     """LLM服务类"""
     
-    def __init__(self, config_path: Optional[str] = None):
-        """初始化LLM服务"""
+    def __init__(self, config_path: Optional[str] = None, client: Optional[httpx.AsyncClient] = None):
+        """
+        初始化LLM服务
+        
+        Args:
+            config_path: 配置文件路径
+            client: 共享的HTTP客户端，未提供时创建带连接池的客户端
+        """
         self.config = self._load_config(config_path)
-        self.client = httpx.AsyncClient()
+        self.client = client or httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_keepalive_connections=32,
+                max_connections=64,
+                # 空闲连接保留60秒，请求间隔较长时也能复用TLS连接
+                keepalive_expiry=60.0
+            ),
+            timeout=httpx.Timeout(self.config.timeout, connect=10.0)
+        )
+        # 地点解析结果缓存，相同输入（忽略首尾空白和大小写）直接返回
+        self._location_cache = TTLCache(maxsize=self.config.cache_max_size, ttl=self.config.cache_ttl)
+        # 路线生成结果缓存，以提示词内容为键，地点列表（含顺序和坐标）相同时直接返回
+        self._route_cache = TTLCache(maxsize=self.config.cache_max_size, ttl=self.config.cache_ttl)
+        # 请求头在服务生命周期内不变，只构建一次
+        self._headers = {
+            "Authorization": f"Bearer {self.config.api_key}",
+            "Content-Type": "application/json"
+        }
         logger.info("LLM服务初始化完成")
     
     def _load_config(self, config_path: Optional[str] = None) -> LLMConfig:
@@ -61,8 +337,8 @@ class LLMService:
             config_path = Path(__file__).parent.parent.parent / "config" / "llm_config.yaml"
         
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config_data = yaml.safe_load(f)
+            config_path = Path(config_path)
+            config_data = _load_yaml(str(config_path), config_path.stat().st_mtime)
             
             return LLMConfig(
                 api_key=config_data['llm']['api_key'],
@@ -70,7 +346,13 @@ class LLMService:
                 model=config_data['llm']['model'],
                 max_tokens=config_data['llm'].get('max_tokens', 1000),
                 temperature=config_data['llm'].get('temperature', 0.3),
-                timeout=config_data['llm'].get('timeout', 30)
+                timeout=config_data['llm'].get('timeout', 30),
+                batch_max_size=config_data['llm'].get('batch_max_size', 8),
+                batch_max_wait_ms=config_data['llm'].get('batch_max_wait_ms', 20),
+                cache_ttl=config_data.get('route_planning', {}).get('cache_ttl', 3600),
+                cache_max_size=config_data.get('route_planning', {}).get('cache_max_size', 1024),
+                trust_llm_output=config_data['llm'].get('trust_llm_output', False),
+                json_mode=config_data['llm'].get('json_mode', True)
             )
             
         except Exception as e:
@@ -94,20 +376,220 @@ class LLMService:
         if not self.client or not self.config:
             raise RuntimeError("LLM服务未正确初始化")
         
+        cache_key = self._location_cache_key(user_input)
+        cached = self._location_cache.get(cache_key)
+        if cached is not None:
+            logger.info("地点解析命中缓存")
+            return cached
+        
+        locations = await self._resolve_without_llm(user_input)
+        if locations is not None:
+            return locations
+        
+        return await self._parse_locations_with_llm(user_input)
+    
+    async def _parse_locations_with_llm(self, user_input: str) -> List[LocationInfo]:
+        """调用LLM解析单条输入，调用方已查过缓存并尝试过无需LLM的解析"""
         logger.info(f"使用真实LLM API解析地点: {user_input}")
         
         # 构建地点解析提示词
         prompt = self._build_location_parsing_prompt(user_input)
         
         # 调用LLM API
-        response = await self._call_llm(prompt)
+        response = await self._call_llm(prompt, system_prompt=LOCATION_PARSING_SYSTEM_PROMPT)
         
         # 解析LLM响应
         locations = self._parse_location_response(response)
         
+        # 空结果可能来自响应解析失败，不缓存
+        if locations:
+            self._location_cache.set(self._location_cache_key(user_input), locations)
+        
         logger.info(f"LLM解析出{len(locations)}个地点")
         return locations
     
+    async def parse_locations_stream(self, user_input: str) -> AsyncIterator[LocationInfo]:
+        """
+        流式解析用户输入中的地点信息，LLM每输出一个完整地点即产出
+        
+        Args:
+            user_input: 用户输入的文本
+            
+        Yields:
+            按LLM输出顺序识别出的地点信息
+        """
+        if not user_input or not user_input.strip():
+            raise ValueError("用户输入不能为空")
+        
+        if not self.client or not self.config:
+            raise RuntimeError("LLM服务未正确初始化")
+        
+        cache_key = self._location_cache_key(user_input)
+        cached = self._location_cache.get(cache_key)
+        if cached is not None:
+            logger.info("地点解析命中缓存")
+            for location in cached:
+                yield location
+            return
+        
+        resolved = await self._resolve_without_llm(user_input)
+        if resolved is not None:
+            for location in resolved:
+                yield location
+            return
+        
+        logger.info(f"使用真实LLM API流式解析地点: {user_input}")
+        
+        prompt = self._build_location_parsing_prompt(user_input)
+        scanner = _LocationItemScanner()
+        locations = []
+        
+        async for delta in self._stream_llm(prompt, system_prompt=LOCATION_PARSING_SYSTEM_PROMPT):
+            for item in scanner.feed(delta):
+                try:
+                    location = self._build_locations([orjson.loads(item)])[0]
+                except Exception as e:
+                    logger.warning(f"跳过无法解析的地点: {e}")
+                    continue
+                
+                locations.append(location)
+                yield location
+        
+        if locations:
+            self._location_cache.set(cache_key, locations)
+        
+        logger.info(f"LLM流式解析出{len(locations)}个地点")
+    
+    async def parse_locations_batch(self, user_inputs: List[str]) -> List[List[LocationInfo]]:
+        """
+        批量解析多个用户输入中的地点信息，未命中缓存的输入合并为一次LLM调用
+        
+        Args:
+            user_inputs: 用户输入的文本列表
+            
+        Returns:
+            与输入顺序一致的地点信息列表
+        """
+        results: List[Optional[List[LocationInfo]]] = [
+            self._location_cache.get(self._location_cache_key(user_input))
+            for user_input in user_inputs
+        ]
+        pending = [i for i, locations in enumerate(results) if locations is None]
+        
+        if not pending:
+            return results
+        
+        # 先尝试无需LLM的解析，只把剩余输入交给LLM
+        resolved = await asyncio.gather(*[self._resolve_without_llm(user_inputs[i]) for i in pending])
+        for i, locations in zip(pending, resolved):
+            if locations is not None:
+                results[i] = locations
+        pending = [i for i, locations in zip(pending, resolved) if locations is None]
+        
+        if not pending:
+            return results
+        
+        if not self.client or not self.config:
+            raise RuntimeError("LLM服务未正确初始化")
+        
+        # 剩余输入已确认需要LLM，不再重复无需LLM的解析
+        if len(pending) == 1:
+            results[pending[0]] = await self._parse_locations_with_llm(user_inputs[pending[0]])
+            return results
+        
+        logger.info(f"使用真实LLM API批量解析地点，共{len(pending)}条输入")
+        
+        pending_inputs = [user_inputs[i] for i in pending]
+        prompt = self._build_batch_location_parsing_prompt(pending_inputs)
+        response = await self._call_llm(
+            prompt,
+            system_prompt=BATCH_LOCATION_PARSING_SYSTEM_PROMPT,
+            max_tokens=self.config.max_tokens * len(pending_inputs)
+        )
+        batch_results = self._parse_batch_location_response(response, len(pending_inputs))
+        
+        # 批量响应中缺失的条目单独重试
+        missing = []
+        for i, locations in zip(pending, batch_results):
+            if locations is None:
+                missing.append(i)
+                continue
+            results[i] = locations
+            if locations:
+                self._location_cache.set(self._location_cache_key(user_inputs[i]), locations)
+        
+        if missing:
+            logger.warning(f"批量解析缺少{len(missing)}条结果，逐条重试")
+            retried = await asyncio.gather(*[self._parse_locations_with_llm(user_inputs[i]) for i in missing])
+            for i, locations in zip(missing, retried):
+                results[i] = locations
+        
+        return results
+    
+    async def _resolve_without_llm(self, user_input: str) -> Optional[List[LocationInfo]]:
+        """
+        尝试不调用LLM直接解析地点，无法处理时返回None
+        
+        支持两类输入：已是地点JSON的输入直接校验后返回；以分隔符隔开的多个城市名
+        通过高德地理编码获取坐标，任一地名未解析到省市级结果或地理编码超时时交由LLM处理。
+        解析成功的结果写入地点缓存
+        """
+        stripped = user_input.strip()
+        
+        if stripped[0] in "[{":
+            try:
+                data = orjson.loads(stripped)
+                raw_locations = data.get("locations") if isinstance(data, dict) else data
+                if isinstance(raw_locations, list) and raw_locations:
+                    logger.info("输入已是地点JSON，跳过LLM解析")
+                    locations = self._build_locations(raw_locations)
+                    if locations:
+                        self._location_cache.set(self._location_cache_key(user_input), locations)
+                    return locations
+            except Exception:
+                pass
+            return None
+        
+        parser = get_location_parser()
+        names = parser.split_input(stripped)
+        if len(names) < 2 or not all(_PLACE_NAME_TOKEN_PATTERN.fullmatch(name) for name in names):
+            return None
+        
+        try:
+            # 地理编码请求在后台继续完成并写入坐标缓存，这里只等待有限时间
+            coordinates = await asyncio.wait_for(
+                asyncio.gather(*[parser.get_coordinates(name) for name in names]),
+                timeout=_RESOLVE_WITHOUT_LLM_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"地理编码超过{_RESOLVE_WITHOUT_LLM_TIMEOUT}秒，改用LLM解析")
+            return None
+        
+        if not all(coord and coord.level != AdminLevel.DISTRICT for coord in coordinates):
+            return None
+        
+        logger.info(f"输入为{len(names)}个城市名，通过地理编码解析，跳过LLM")
+        raw_locations = []
+        for name, coord in zip(names, coordinates):
+            standard_name = parser.normalize_location(name)
+            raw_locations.append({
+                "name": standard_name,
+                "display_name": standard_name,
+                "coordinates": [coord.lng, coord.lat],
+                "type": "city"
+            })
+        locations = self._build_locations(raw_locations)
+        self._location_cache.set(self._location_cache_key(user_input), locations)
+        return locations
+    
+    def _location_cache_key(self, user_input: str) -> str:
+        """地点解析缓存键，忽略首尾空白和大小写"""
+        return hashlib.blake2b(user_input.strip().lower().encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _route_cache_key(self, prompt: str) -> str:
+        """路线生成缓存键，以路线提示词内容为键"""
+        return hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+    
     async def generate_route(self, locations: List[LocationInfo]) -> RouteVisualization:
         """
         生成路线可视化
@@ -125,66 +607,166 @@ class LLMService:
         if not self.client or not self.config:
             raise RuntimeError("LLM服务未正确初始化")
         
-        logger.info(f"LLM生成路线，包含{len(locations)}个地点")
-        
         # 构建路线生成提示词
         prompt = self._build_route_generation_prompt(locations)
         
+        cache_key = self._route_cache_key(prompt)
+        cached = self._route_cache.get(cache_key)
+        if cached is not None:
+            logger.info("路线生成命中缓存")
+            # 返回副本，调用方修改结果不影响缓存
+            return cached.model_copy(deep=True)
+        
+        logger.info(f"LLM生成路线，包含{len(locations)}个地点")
+        
         # 调用LLM API
-        response = await self._call_llm(prompt)
+        response = await self._call_llm(prompt, system_prompt=ROUTE_GENERATION_SYSTEM_PROMPT)
         
         # 解析LLM响应
         route_visualization = self._parse_route_response(response, locations)
+        self._route_cache.set(cache_key, route_visualization.model_copy(deep=True))
         
         logger.info(f"LLM生成路线成功，包含{len(route_visualization.connections)}个连接")
         return route_visualization
     
+    async def plan_route(
+        self,
+        user_input: str,
+        max_locations: Optional[int] = None
+    ) -> Tuple[List[LocationInfo], Optional[RouteVisualization]]:
+        """
+        一次LLM调用同时完成地点解析和路线生成
+        
+        相比先调用parse_locations再调用generate_route，省去第二次LLM往返；
+        地点命中缓存或无需LLM即可解析时，只生成路线
+        
+        Args:
+            user_input: 用户输入的文本
+            max_locations: 最多保留的地点数量，超出部分截断
+            
+        Returns:
+            (地点列表, 路线可视化对象)，未识别到地点时路线为None
+        """
+        if not user_input or not user_input.strip():
+            raise ValueError("用户输入不能为空")
+        
+        if not self.client or not self.config:
+            raise RuntimeError("LLM服务未正确初始化")
+        
+        # 地点已在缓存中或无需LLM即可解析时，只需生成路线，路线生成自带缓存
+        cache_key = self._location_cache_key(user_input)
+        locations = self._location_cache.get(cache_key)
+        if locations is None:
+            locations = await self._resolve_without_llm(user_input)
+        if locations is not None:
+            locations = self._truncate_locations(locations, max_locations)
+            if not locations:
+                return [], None
+            return locations, await self.generate_route(locations)
+        
+        logger.info(f"LLM一次性规划路线: {user_input[:100]}...")
+        
+        # 同一响应中包含地点和连接，输出长度约为单独解析的两倍
+        response = await self._call_llm(
+            self._build_location_parsing_prompt(user_input),
+            system_prompt=ROUTE_PLANNING_SYSTEM_PROMPT,
+            max_tokens=self.config.max_tokens * 2
+        )
+        
+        locations = self._parse_location_response(response)
+        if not locations:
+            return [], None
+        
+        # 缓存截断前的完整解析结果，与parse_locations共用
+        self._location_cache.set(cache_key, locations)
+        locations = self._truncate_locations(locations, max_locations)
+        
+        route = self._parse_route_response(response, locations)
+        
+        # 截断后丢弃指向已移除地点的连接
+        names = {loc.name for loc in locations} | {loc.display_name for loc in locations}
+        connections = [
+            conn for conn in route.connections
+            if conn["from"] in names and conn["to"] in names
+        ]
+        if not connections:
+            connections = self._build_default_connections(locations)
+        route.connections = connections
+        
+        # 写入路线缓存，之后相同地点的请求由generate_route直接返回
+        route_key = self._route_cache_key(self._build_route_generation_prompt(locations))
+        self._route_cache.set(route_key, route.model_copy(deep=True))
+        
+        return locations, route
+    
+    def _truncate_locations(self, locations: List[LocationInfo], max_locations: Optional[int]) -> List[LocationInfo]:
+        """截取前max_locations个地点"""
+        if max_locations and len(locations) > max_locations:
+            logger.warning(f"地点数量超限，截取前{max_locations}个")
+            return locations[:max_locations]
+        return locations
+    
+    def _build_default_connections(self, locations: List[LocationInfo]) -> List[Dict[str, Any]]:
+        """为相邻地点创建默认连接"""
+        connections = []
+        for i in range(len(locations) - 1):
+            connections.append({
+                "from": locations[i].name,
+                "to": locations[i + 1].name,
+                "distance": f"{150 + i*100}km",
+                "duration": f"{2 + i}小时",
+                "transport": "高铁",
+                "description": f"从{locations[i].name}到{locations[i + 1].name}"
+            })
+        return connections
+    
+    def _calculate_map_bounds(self, locations: List[LocationInfo]) -> Dict[str, float]:
+        """单次遍历计算地点的地图边界（四周各留0.5度边距）"""
+        if not locations:
+            return {"north": 40, "south": 30, "east": 120, "west": 110}
+        
+        lng_min = lng_max = locations[0].coordinates[0]
+        lat_min = lat_max = locations[0].coordinates[1]
+        
+        for loc in locations:
+            lng, lat = loc.coordinates[0], loc.coordinates[1]
+            if lng < lng_min:
+                lng_min = lng
+            elif lng > lng_max:
+                lng_max = lng
+            if lat < lat_min:
+                lat_min = lat
+            elif lat > lat_max:
+                lat_max = lat
+        
+        return {
+            "north": lat_max + 0.5,
+            "south": lat_min - 0.5,
+            "east": lng_max + 0.5,
+            "west": lng_min - 0.5
+        }
+    
     def _build_route_generation_prompt(self, locations: List[LocationInfo]) -> str:
-        """构建路线生成提示词"""
-        location_names = [loc.name for loc in locations]
+        """构建路线生成提示词（仅包含地点相关内容，静态要求见ROUTE_GENERATION_SYSTEM_PROMPT）"""
         location_details = []
+        location_coordinates = []
         for loc in locations:
             location_details.append(f"- {loc.display_name}: {loc.description}")
+            location_coordinates.append(f"- {loc.name}: [{loc.coordinates[0]}, {loc.coordinates[1]}]")
         
-        prompt = f"""
-请为以下地点生成一个最优的旅行路线：
-
-地点列表：
-{chr(10).join(location_details)}
-
-要求：
-1. 生成地点之间的连接关系，包括距离和预估时长
-2. 考虑地理位置的合理性，优化路线顺序
-3. 提供地图边界框信息
-4. 推荐合适的视觉样式
-
-请以JSON格式返回结果，包含：
-- connections: 连接关系数组，每个包含from, to, distance(km), duration(分钟)
-- map_bounds: 地图边界，包含north, south, east, west
-- visual_style: 视觉样式，包含theme, color_scheme, line_style
-
-地点坐标信息：
-{chr(10).join([f"- {loc.name}: [{loc.coordinates[0]}, {loc.coordinates[1]}]" for loc in locations])}
-"""
-        return prompt
+        return (
+            _ROUTE_PROMPT_LOCATIONS_HEADER + "\n".join(location_details)
+            + _ROUTE_PROMPT_COORDINATES_HEADER + "\n".join(location_coordinates) + "\n"
+        )
     
     def _parse_route_response(self, response: str, locations: List[LocationInfo]) -> RouteVisualization:
         """解析路线生成响应"""
         try:
-            import json
-            import re
-            
-            # 提取JSON部分，LLM可能返回包含说明文字的响应
-            json_match = re.search(r'```json\s*(\{.*?\})\s*```', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                # 如果没有找到```json```标记，尝试直接解析
-                json_str = response.strip()
+            json_str = _extract_json_str(response)
             
             logger.info(f"提取的路线JSON字符串: {json_str[:200]}...")
             
-            data = json.loads(json_str)
+            data = orjson.loads(json_str)
             
             # 构建连接信息，确保包含距离和时长
             connections = []
@@ -202,30 +784,11 @@ class LLMService:
                 connections.append(connection)
             
             # 如果没有连接信息，为相邻地点创建默认连接
-            if not connections and len(locations) > 1:
-                for i in range(len(locations) - 1):
-                    connection = {
-                        "from": locations[i].name,
-                        "to": locations[i + 1].name,
-                        "distance": f"{150 + i*100}km",
-                        "duration": f"{2 + i}小时",
-                        "transport": "高铁",
-                        "description": f"从{locations[i].name}到{locations[i + 1].name}"
-                    }
-                    connections.append(connection)
+            if not connections:
+                connections = self._build_default_connections(locations)
             
             # 计算地图边界
-            if locations:
-                lngs = [loc.coordinates[0] for loc in locations]
-                lats = [loc.coordinates[1] for loc in locations]
-                map_bounds = {
-                    "north": max(lats) + 0.5,
-                    "south": min(lats) - 0.5,
-                    "east": max(lngs) + 0.5,
-                    "west": min(lngs) - 0.5
-                }
-            else:
-                map_bounds = {"north": 40, "south": 30, "east": 120, "west": 110}
+            map_bounds = self._calculate_map_bounds(locations)
             
             # 视觉样式
             visual_style = data.get("visual_style", {
@@ -235,7 +798,13 @@ class LLMService:
                 "marker_style": "circle"
             })
             
-            route_viz = RouteVisualization(
+            # 各字段已在上面整理为目标类型，信任LLM输出时跳过校验直接构建
+            if self.config.trust_llm_output and isinstance(visual_style, dict):
+                build_route = RouteVisualization.model_construct
+            else:
+                build_route = RouteVisualization
+            
+            route_viz = build_route(
                 locations=locations,
                 connections=connections,
                 map_bounds=map_bounds,
@@ -250,31 +819,10 @@ class LLMService:
             logger.error(f"原始响应: {response[:500]}...")
             
             # 返回基本的路线可视化作为fallback
-            connections = []
-            if len(locations) > 1:
-                for i in range(len(locations) - 1):
-                    connection = {
-                        "from": locations[i].name,
-                        "to": locations[i + 1].name,
-                        "distance": f"{150 + i*100}km",
-                        "duration": f"{2 + i}小时",
-                        "transport": "高铁",
-                        "description": f"从{locations[i].name}到{locations[i + 1].name}"
-                    }
-                    connections.append(connection)
+            connections = self._build_default_connections(locations)
             
             # 计算地图边界
-            if locations:
-                lngs = [loc.coordinates[0] for loc in locations]
-                lats = [loc.coordinates[1] for loc in locations]
-                map_bounds = {
-                    "north": max(lats) + 0.5,
-                    "south": min(lats) - 0.5,
-                    "east": max(lngs) + 0.5,
-                    "west": min(lngs) - 0.5
-                }
-            else:
-                map_bounds = {"north": 40, "south": 30, "east": 120, "west": 110}
+            map_bounds = self._calculate_map_bounds(locations)
             
             return RouteVisualization(
                 locations=locations,
@@ -288,35 +836,32 @@ class LLMService:
                 }
             )
     
-    async def _call_llm(self, prompt: str) -> str:
+    async def _call_llm(
+        self,
+        prompt: str,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        max_tokens: Optional[int] = None
+    ) -> str:
         """调用LLM API"""
-        messages = [
-            {"role": "system", "content": "你是一个专业的地理信息和路线规划专家。"},
-            {"role": "user", "content": prompt}
-        ]
-        
         try:
-            headers = {
-                "Authorization": f"Bearer {self.config.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": self.config.model,
-                "messages": messages,
-                "max_tokens": self.config.max_tokens,
-                "temperature": self.config.temperature
-            }
+            payload = self._build_llm_payload(prompt, system_prompt, max_tokens)
             
             response = await self.client.post(
                 self.config.api_url,
-                headers=headers,
-                json=payload,
+                headers=self._headers,
+                # 用orjson序列化请求体，Content-Type已在请求头中声明
+                content=orjson.dumps(payload),
                 timeout=self.config.timeout
             )
             
             response.raise_for_status()
-            result = response.json()
+            
+            # 较大的响应体放到线程中解码，避免阻塞事件循环
+            body = response.content
+            if len(body) > _THREADED_DECODE_THRESHOLD:
+                result = await asyncio.to_thread(orjson.loads, body)
+            else:
+                result = orjson.loads(body)
             
             return result["choices"][0]["message"]["content"]
             
@@ -324,71 +869,82 @@ class LLMService:
             logger.error(f"LLM API调用失败: {e}")
             raise
     
+    async def _stream_llm(
+        self,
+        prompt: str,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """以流式方式调用LLM API，逐段产出生成的文本"""
+        payload = self._build_llm_payload(prompt, system_prompt, max_tokens)
+        payload["stream"] = True
+        
+        try:
+            async with self.client.stream(
+                "POST",
+                self.config.api_url,
+                headers=self._headers,
+                content=orjson.dumps(payload),
+                timeout=self.config.timeout
+            ) as response:
+                response.raise_for_status()
+                
+                # 服务端以SSE格式推送，每个data行是一个增量片段
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    choices = orjson.loads(data).get("choices")
+                    if not choices:
+                        continue
+                    
+                    content = choices[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+            
+        except Exception as e:
+            logger.error(f"LLM API流式调用失败: {e}")
+            raise
+    
+    def _build_llm_payload(
+        self,
+        prompt: str,
+        system_prompt: str,
+        max_tokens: Optional[int]
+    ) -> Dict[str, Any]:
+        """构建LLM API请求体"""
+        payload = {
+            "model": self.config.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": max_tokens or self.config.max_tokens,
+            "temperature": self.config.temperature
+        }
+        # 要求服务端只输出JSON对象，省去从说明文字中提取JSON的失败重试；
+        # OpenAI兼容接口要求消息中提到JSON，否则直接返回400，未提到时不开启
+        if self.config.json_mode and any("json" in message["content"].lower() for message in payload["messages"]):
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+    
     def _build_location_parsing_prompt(self, user_input: str) -> str:
-        """构建地点解析提示词"""
-        return f"""
-请从用户输入中识别所有提到的地点，并提供准确的地理信息。
-
-用户输入：{user_input}
-
-请识别并返回：
-1. 所有提到的城市、景点、地标
-2. 每个地点的准确名称和坐标
-3. 地点的类型分类
-4. 适合的显示名称
-
-要求：
-- 准确识别地点名称，包括中英文对照
-- 提供精确的经纬度坐标
-- 合理分类地点类型
-- 处理模糊或不完整的地名
-- 返回结构化的JSON数据
-
-输出格式：
-{{
-  "locations": [
-    {{
-      "name": "地点原名",
-      "display_name": "显示名称", 
-      "coordinates": [经度, 纬度],
-      "type": "city|attraction|landmark|natural",
-      "description": "简短描述"
-    }}
-  ]
-}}
-"""
+        """构建地点解析提示词（仅包含用户输入，静态要求见LOCATION_PARSING_SYSTEM_PROMPT）"""
+        return _LOCATION_PROMPT_PREFIX + user_input
     
     def _parse_location_response(self, response: str) -> List[LocationInfo]:
         """解析地点识别响应"""
         try:
-            import json
-            import re
-            
-            # 提取JSON部分，LLM可能返回包含说明文字的响应
-            json_match = re.search(r'```json\s*(\{.*?\})\s*```', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-            else:
-                # 如果没有找到```json```标记，尝试直接解析
-                json_str = response.strip()
+            json_str = _extract_json_str(response)
             
             logger.info(f"提取的JSON字符串: {json_str[:200]}...")
             
-            data = json.loads(json_str)
-            locations = []
-            
-            for loc_data in data.get("locations", []):
-                # 确保数据格式正确，避免Pydantic验证错误
-                clean_data = {
-                    "name": str(loc_data.get("name", "")),
-                    "display_name": str(loc_data.get("display_name", loc_data.get("name", ""))),
-                    "coordinates": list(loc_data.get("coordinates", [0.0, 0.0])),
-                    "type": str(loc_data.get("type", "city")),
-                    "description": str(loc_data.get("description", "")) if loc_data.get("description") else None
-                }
-                
-                location = LocationInfo(**clean_data)
-                locations.append(location)
+            data = orjson.loads(json_str)
+            locations = self._build_locations(data.get("locations", []))
             
             logger.info(f"成功解析出{len(locations)}个地点")
             return locations
@@ -399,11 +955,103 @@ class LLMService:
             # 返回空列表作为fallback
             return []
     
+    def _build_locations(self, raw_locations: List[Dict[str, Any]]) -> List[LocationInfo]:
+        """将LLM返回的地点字典转换为LocationInfo列表"""
+        clean_locations = []
+        
+        for loc_data in raw_locations:
+            # 确保数据格式正确，避免Pydantic验证错误；LLM通常已返回正确类型，仅在类型不符时转换
+            name = loc_data.get("name", "")
+            if type(name) is not str:
+                name = str(name)
+            
+            display_name = loc_data.get("display_name", name)
+            if type(display_name) is not str:
+                display_name = str(display_name)
+            
+            # 数值字符串和整数由校验器统一转换为float
+            coordinates = loc_data.get("coordinates", [0.0, 0.0])
+            if type(coordinates) is not list:
+                coordinates = list(coordinates)
+            
+            location_type = loc_data.get("type", "city")
+            if type(location_type) is not str:
+                location_type = str(location_type)
+            
+            description = loc_data.get("description")
+            if not description:
+                description = None
+            elif type(description) is not str:
+                description = str(description)
+            
+            clean_locations.append({
+                "name": name,
+                "display_name": display_name,
+                "coordinates": coordinates,
+                "type": location_type,
+                "description": description
+            })
+        
+        # 整个列表交给预构建的校验器一次完成，比逐个构建LocationInfo（包括model_construct）更快
+        return _LOCATION_LIST_ADAPTER.validate_python(clean_locations)
+    
+    def _build_batch_location_parsing_prompt(self, user_inputs: List[str]) -> str:
+        """构建批量地点解析提示词（仅包含用户输入，静态要求见BATCH_LOCATION_PARSING_SYSTEM_PROMPT）"""
+        numbered_inputs = "\n".join(f"[{i}] {text}" for i, text in enumerate(user_inputs))
+        return f"用户输入（共{len(user_inputs)}条）：\n{numbered_inputs}"
+    
+    def _parse_batch_location_response(self, response: str, count: int) -> List[Optional[List[LocationInfo]]]:
+        """解析批量地点识别响应，缺失或无法解析的条目为None"""
+        results: List[Optional[List[LocationInfo]]] = [None] * count
+        
+        try:
+            json_str = _extract_json_str(response)
+            
+            data = orjson.loads(json_str)
+            
+            for item in data.get("results", []):
+                index = item.get("index")
+                if isinstance(index, int) and 0 <= index < count:
+                    results[index] = self._build_locations(item.get("locations", []))
+            
+        except Exception as e:
+            logger.error(f"解析批量地点响应失败: {e}")
+            logger.error(f"原始响应: {response[:500]}...")
+        
+        return results
+    
+    async def warmup(self):
+        """
+        预先建立到LLM API的连接
+        
+        发送一次HEAD请求完成TCP和TLS握手，连接留在连接池中供首个真实请求复用。
+        响应状态码不重要，失败也只记录日志
+        """
+        try:
+            await self.client.head(self.config.api_url, timeout=10.0)
+            logger.info("LLM API连接预热完成")
+        except Exception as e:
+            logger.warning("LLM API连接预热失败: %s", e)
+    
     async def close(self):
         """关闭HTTP客户端"""
         if self.client:
             await self.client.aclose()
 
 
-# 全局LLM服务实例
-llm_service = LLMService()
\ No newline at end of file
+# 全局LLM服务实例，首次使用时创建
+_llm_service: Optional[LLMService] = None
+
+
+def get_llm_service() -> LLMService:
+    """获取全局LLM服务实例，首次调用时加载配置并创建"""
+    global _llm_service
+    if _llm_service is None:
+        _llm_service = LLMService()
+    return _llm_service
+
+
+async def close_llm_service():
+    """关闭已创建的全局LLM服务实例"""
+    if _llm_service is not None:
+        await _llm_service.close()
@@ -1,65 +1,120 @@
 import re
 import asyncio
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 import httpx
+import orjson
 from app.models import ParseResult, ValidationResult, Coordinate
-from app.config import config
+from app.config import get_config
+from app.utils.cache import TTLCache
+from app.utils.rate_limit import AsyncRateLimiter
+
+# 地名分隔符：箭头（含两侧空白）、中英文逗号、空白，连续出现视为一个分隔
+_SEPARATOR_PATTERN = re.compile(r'(?:\s*(?:→|->)\s*|[,，\s])+')
+
+# 中文字符
+_CHINESE_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fff]')
+
+# 高德API超出并发或QPS限制时返回的infocode
+_AMAP_RATE_LIMITED_INFOCODES = frozenset({'10019', '10020', '10021'})
+
+# 触发限流后首次重试前的等待时间（秒），之后每次翻倍
+_GEOCODE_RETRY_BASE_DELAY = 0.2
+
+# 地名别名映射
+_ALIAS_MAP = {
+    '帝都': '北京',
+    '魔都': '上海',
+    '花城': '广州',
+    '羊城': '广州',
+    '春城': '昆明',
+    '泉城': '济南',
+    '冰城': '哈尔滨',
+    '山城': '重庆',
+    '蓉城': '成都',
+    '星城': '长沙',
+    '江城': '武汉',
+    '鹭岛': '厦门'
+}
+
+# 常见错别字映射
+_TYPO_MAP = {
+    '北经': '北京',
+    '上海市': '上海',
+    '广洲': '广州',
+    '深圳市': '深圳',
+    '杭洲': '杭州',
+    '南经': '南京',
+    '西按': '西安',
+    '成都市': '成都',
+    '重庆市': '重庆',
+    '武汗': '武汉'
+}
+
+# 别名和错别字合并后的标准化映射（两表键不重叠）
+_NORMALIZE_MAP = {**_TYPO_MAP, **_ALIAS_MAP}
+
+
+def _compile_keyword_pattern(mapping: Dict[str, str]) -> re.Pattern:
+    """将映射表的键编译为一个多选正则，较长的词条优先匹配"""
+    keywords = sorted(mapping, key=len, reverse=True)
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+
+
+# 错别字和别名的合并匹配模式，一次扫描找出输入中出现的全部词条
+_KEYWORD_PATTERN = _compile_keyword_pattern(_NORMALIZE_MAP)
+
+
+async def _aclose_quietly(client: httpx.AsyncClient):
+    """关闭客户端，旧事件循环已关闭导致连接无法正常关闭时忽略错误"""
+    try:
+        await client.aclose()
+    except Exception:
+        pass
+
 
 class LocationParser:
     """地名解析服务"""
     
     def __init__(self):
+        config = get_config()
         self.amap_config = config.get_amap_config()
         self.limits = config.get_limits()
-        self.cache: Dict[str, Coordinate] = {}
-        
-        # 地名别名映射
-        self.alias_map = {
-            '帝都': '北京',
-            '魔都': '上海',
-            '花城': '广州',
-            '羊城': '广州',
-            '春城': '昆明',
-            '泉城': '济南',
-            '冰城': '哈尔滨',
-            '山城': '重庆',
-            '蓉城': '成都',
-            '星城': '长沙',
-            '江城': '武汉',
-            '鹭岛': '厦门'
-        }
-        
-        # 常见错别字映射
-        self.typo_map = {
-            '北经': '北京',
-            '上海市': '上海',
-            '广洲': '广州',
-            '深圳市': '深圳',
-            '杭洲': '杭州',
-            '南经': '南京',
-            '西按': '西安',
-            '成都市': '成都',
-            '重庆市': '重庆',
-            '武汗': '武汉'
-        }
+        # 地理编码结果缓存，以标准化后的地名为键，别名和错别字共享同一条目
+        cache_config = config.get_cache_config()
+        self.cache = TTLCache(maxsize=cache_config.max_size, ttl=cache_config.ttl_seconds)
+        # 限制同时进行的地理编码请求数，避免超出高德API的QPS限制
+        self._geocode_semaphore = asyncio.Semaphore(self.limits.geocode_concurrency)
+        # 平滑请求速率，避免突发请求触发高德API的QPS限流
+        self._geocode_limiter = AsyncRateLimiter(self.limits.geocode_qps)
+        # 高德API共享HTTP客户端，首次请求时在当前事件循环中创建
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 正在关闭的旧客户端任务，保留引用直到关闭完成
+        self._closing_tasks: Set[asyncio.Task] = set()
+        # 进行中的地理编码请求，相同标准地名的并发查询共享同一次API调用
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # 地名别名映射和常见错别字映射
+        self.alias_map = _ALIAS_MAP
+        self.typo_map = _TYPO_MAP
     
     async def parse_input(self, input_text: str) -> ParseResult:
         """解析用户输入的地名文本"""
         try:
             # 1. 清理和分割输入
-            locations = self._split_input(input_text)
+            locations = self.split_input(input_text)
             
             # 2. 验证地名数量
-            if len(locations) < self.limits['min_locations']:
+            if len(locations) < self.limits.min_locations:
                 return ParseResult(
                     success=False,
-                    errors=[f"请输入至少{self.limits['min_locations']}个地名"]
+                    errors=[f"请输入至少{self.limits.min_locations}个地名"]
                 )
             
-            if len(locations) > self.limits['max_locations']:
+            if len(locations) > self.limits.max_locations:
                 return ParseResult(
                     success=False,
-                    errors=[f"最多支持{self.limits['max_locations']}个地名"]
+                    errors=[f"最多支持{self.limits.max_locations}个地名"]
                 )
             
             # 3. 验证地名有效性
@@ -75,15 +130,22 @@ class LocationParser:
             coordinates = []
             errors = []
             
+            # 相同地名只查询一次，各地名并发查询后按输入顺序取回结果
+            unique_locations = list(dict.fromkeys(locations))
+            results = await asyncio.gather(
+                *[self.get_coordinates(location) for location in unique_locations],
+                return_exceptions=True
+            )
+            resolved = dict(zip(unique_locations, results))
+            
             for location in locations:
-                try:
-                    coord = await self.get_coordinates(location)
-                    if coord:
-                        coordinates.append(coord)
-                    else:
-                        errors.append(f"未找到地名：{location}")
-                except Exception as e:
-                    errors.append(f"解析地名 {location} 时出错：{str(e)}")
+                result = resolved[location]
+                if isinstance(result, Exception):
+                    errors.append(f"解析地名 {location} 时出错：{str(result)}")
+                elif result:
+                    coordinates.append(result)
+                else:
+                    errors.append(f"未找到地名：{location}")
             
             # 5. 返回结果
             success = len(errors) == 0 and len(coordinates) == len(locations)
@@ -102,18 +164,13 @@ class LocationParser:
                 errors=[f"解析过程中发生错误：{str(e)}"]
             )
     
-    def _split_input(self, input_text: str) -> List[str]:
+    def split_input(self, input_text: str) -> List[str]:
         """分割输入文本为地名列表"""
         # 清理输入
         text = input_text.strip()
         
-        # 支持多种分隔符：箭头、逗号、空格
-        # 先处理箭头
-        text = re.sub(r'\s*→\s*', ',', text)
-        text = re.sub(r'\s*->\s*', ',', text)
-        
-        # 再处理逗号和空格
-        locations = re.split(r'[,，\s]+', text)
+        # 支持多种分隔符：箭头、逗号、空格，一次切分
+        locations = _SEPARATOR_PATTERN.split(text)
         
         # 过滤空字符串，但保留重复项用于后续验证
         result = []
@@ -141,7 +198,7 @@ class LocationParser:
         
         # 检查地名有效性（这里简化处理，实际应该调用地图API验证）
         for loc in locations:
-            normalized_loc = self._normalize_location(loc)
+            normalized_loc = self.normalize_location(loc)
             if not normalized_loc:
                 invalid_locations.append(loc)
         
@@ -157,18 +214,15 @@ class LocationParser:
             messages=messages
         )
     
-    def _normalize_location(self, location: str) -> Optional[str]:
+    def normalize_location(self, location: str) -> Optional[str]:
         """标准化地名"""
-        # 处理别名
-        if location in self.alias_map:
-            return self.alias_map[location]
-        
-        # 处理错别字
-        if location in self.typo_map:
-            return self.typo_map[location]
+        # 处理别名和错别字
+        normalized = _NORMALIZE_MAP.get(location)
+        if normalized is not None:
+            return normalized
         
         # 简单验证：至少包含中文字符
-        if re.search(r'[\u4e00-\u9fff]', location):
+        if _CHINESE_CHAR_PATTERN.search(location):
             return location
         
         return None
@@ -176,55 +230,117 @@ class LocationParser:
     async def get_coordinates(self, location_name: str) -> Optional[Coordinate]:
         """获取地名的地理坐标"""
         # 标准化地名
-        normalized_name = self._normalize_location(location_name)
+        normalized_name = self.normalize_location(location_name)
         if not normalized_name:
             return None
         
         # 检查缓存
-        if normalized_name in self.cache:
-            return self.cache[normalized_name]
+        cached = self.cache.get(normalized_name)
+        if cached is not None:
+            return cached
+        
+        task = self._inflight.get(normalized_name)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._geocode(location_name, normalized_name))
+            self._inflight[normalized_name] = task
+            task.add_done_callback(lambda t: self._release(normalized_name, t))
         
+        # 单个调用方被取消时不影响共享同一请求的其他调用方
+        return await asyncio.shield(task)
+    
+    def _release(self, normalized_name: str, task: asyncio.Future):
+        """请求完成后移出进行中映射"""
+        if self._inflight.get(normalized_name) is task:
+            del self._inflight[normalized_name]
+    
+    async def _geocode(self, location_name: str, normalized_name: str) -> Optional[Coordinate]:
+        """调用高德地图API查询标准地名的坐标，成功时写入缓存"""
         try:
             # 调用高德地图API
-            async with httpx.AsyncClient() as client:
-                params = {
-                    'key': self.amap_config['api_key'],
-                    'address': normalized_name,
-                    'output': 'json'
-                }
+            params = {
+                'key': self.amap_config.api_key,
+                'address': normalized_name,
+                'output': 'json'
+            }
+            
+            for attempt in range(self.limits.geocode_max_retries + 1):
+                async with self._geocode_semaphore:
+                    await self._geocode_limiter.acquire()
+                    response = await self._get_client().get("/geocode/geo", params=params)
                 
-                response = await client.get(
-                    f"{self.amap_config['base_url']}/geocode/geo",
-                    params=params,
-                    timeout=10.0
-                )
+                data = orjson.loads(response.content) if response.status_code == 200 else None
+                if not self._is_rate_limited(response.status_code, data) or attempt == self.limits.geocode_max_retries:
+                    break
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if data.get('status') == '1' and data.get('geocodes'):
-                        geocode = data['geocodes'][0]
-                        location_str = geocode.get('location', '')
-                        
-                        if location_str:
-                            lng, lat = map(float, location_str.split(','))
-                            
-                            coordinate = Coordinate(
-                                lng=lng,
-                                lat=lat,
-                                name=geocode.get('formatted_address', normalized_name),
-                                level=self._determine_level(geocode.get('level', ''))
-                            )
-                            
-                            # 缓存结果
-                            self.cache[normalized_name] = coordinate
-                            return coordinate
+                # 被限流时指数退避后重试
+                await asyncio.sleep(_GEOCODE_RETRY_BASE_DELAY * 2 ** attempt)
+            
+            if data and data.get('status') == '1' and data.get('geocodes'):
+                geocode = data['geocodes'][0]
+                location_str = geocode.get('location', '')
                 
+                if location_str:
+                    lng, lat = map(float, location_str.split(','))
+                    
+                    coordinate = Coordinate(
+                        lng=lng,
+                        lat=lat,
+                        name=geocode.get('formatted_address', normalized_name),
+                        level=self._determine_level(geocode.get('level', ''))
+                    )
+                    
+                    # 缓存结果
+                    self.cache.set(normalized_name, coordinate)
+                    return coordinate
+            
         except Exception as e:
             print(f"获取坐标失败 {location_name}: {e}")
         
         return None
     
+    @staticmethod
+    def _is_rate_limited(status_code: int, data: Optional[Dict]) -> bool:
+        """判断高德API响应是否为限流错误"""
+        if status_code == 429:
+            return True
+        return bool(data) and data.get('status') != '1' and data.get('infocode') in _AMAP_RATE_LIMITED_INFOCODES
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取共享的HTTP客户端，连接池跨请求复用"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            if self._client is not None:
+                self._close_stale_client(self._client, self._client_loop)
+            self._client = httpx.AsyncClient(
+                base_url=self.amap_config.base_url,
+                # 连接阶段快速失败，由传输层重试建连
+                timeout=httpx.Timeout(10.0, connect=2.0),
+                transport=httpx.AsyncHTTPTransport(
+                    retries=2,
+                    # 保活连接数与最大连接数一致，突发请求结束后连接全部留在池中复用，无需重新解析和握手
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=60.0)
+                )
+            )
+            self._client_loop = loop
+        return self._client
+    
+    def _close_stale_client(self, client: httpx.AsyncClient, client_loop: Optional[asyncio.AbstractEventLoop]):
+        """关闭绑定在旧事件循环上的客户端，释放其连接池"""
+        if client_loop is not None and client_loop.is_running():
+            # 旧事件循环仍在其他线程运行，连接需在所属循环上关闭
+            asyncio.run_coroutine_threadsafe(client.aclose(), client_loop)
+            return
+        
+        task = asyncio.ensure_future(_aclose_quietly(client))
+        self._closing_tasks.add(task)
+        task.add_done_callback(self._closing_tasks.discard)
+    
+    async def aclose(self):
+        """关闭HTTP客户端"""
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+    
     def _determine_level(self, level_str: str) -> str:
         """确定行政级别"""
         if '省' in level_str or '自治区' in level_str or '直辖市' in level_str:
@@ -238,18 +354,40 @@ class LocationParser:
         """生成修正建议"""
         suggestions = []
         
+        found = set(_KEYWORD_PATTERN.findall(input_text))
+        if not found:
+            return suggestions
+        
         # 检查是否包含常见错别字
         for typo, correct in self.typo_map.items():
-            if typo in input_text:
+            if typo in found:
                 suggestions.append(f"是否想输入：{input_text.replace(typo, correct)}")
         
         # 检查是否包含别名
         for alias, standard in self.alias_map.items():
-            if alias in input_text:
+            if alias in found:
                 suggestions.append(f"建议使用标准地名：{input_text.replace(alias, standard)}")
         
         return suggestions[:3]  # 最多返回3个建议
 
     async def suggest_corrections(self, input_text: str) -> List[str]:
         """智能建议修正"""
-        return self._generate_suggestions(input_text)
\ No newline at end of file
+        return self._generate_suggestions(input_text)
+
+
+# 全局地名解析服务实例，首次使用时创建，API路由和LLM服务共用同一份缓存和连接池
+_location_parser: Optional[LocationParser] = None
+
+
+def get_location_parser() -> LocationParser:
+    """获取全局地名解析服务实例"""
+    global _location_parser
+    if _location_parser is None:
+        _location_parser = LocationParser()
+    return _location_parser
+
+
+async def close_location_parser():
+    """关闭已创建的全局地名解析服务实例"""
+    if _location_parser is not None:
+        await _location_parser.aclose()
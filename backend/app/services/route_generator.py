@@ -1,6 +1,158 @@
 import math
-from typing import List, Dict, Optional, Tuple
-from app.models import Coordinate, RouteData, PathPoint, MapBounds, LabelPosition
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Optional, Tuple, Union
+from pydantic import TypeAdapter
+from app.models import Coordinate, RouteData, PathPoint, PackedPath, MapBounds, LabelPosition
+
+EARTH_RADIUS_KM = 6371  # 地球半径（公里）
+
+# 标签候选方位及偏移量，按优先级排列，全部重叠时使用第一个
+_LABEL_CANDIDATES = (
+    ('top', 0, 20),
+    ('right', 20, 0),
+    ('bottom', 0, -20),
+    ('left', -20, 0)
+)
+_LABEL_HEIGHT = 0.005  # 标签固定高度
+
+# 路径点和标签列表整体校验，比逐个创建模型对象开销更小
+_PATH_POINTS_ADAPTER = TypeAdapter(List[PathPoint])
+_LABEL_POSITIONS_ADAPTER = TypeAdapter(List[LabelPosition])
+
+
+def _label_bounds(lng: float, lat: float, width: float, offset_x: float, offset_y: float) -> Dict:
+    """根据标签锚点、宽度和偏移量计算边界框"""
+    return {
+        'x': lng + offset_x * 0.001,
+        'y': lat + offset_y * 0.001,
+        'width': width,
+        'height': _LABEL_HEIGHT
+    }
+
+
+def _label_width(name: str) -> float:
+    """根据文本长度估算标签宽度"""
+    return max(0.01, len(name) * 0.002)
+
+
+def _haversine(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    """使用Haversine公式计算地球表面两点间的距离（公里）"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+    
+    a = (math.sin(delta_lat / 2) ** 2 + 
+         math.cos(lat1_rad) * math.cos(lat2_rad) * 
+         math.sin(delta_lng / 2) ** 2)
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    
+    return EARTH_RADIUS_KM * c
+
+
+def _segment_control_points(lngs: List[float], lats: List[float]) -> List[Tuple[float, float, float, float]]:
+    """
+    一次遍历所有相邻点对，计算每段贝塞尔曲线的两个控制点
+    
+    Returns:
+        每段的(控制点1经度, 控制点1纬度, 控制点2经度, 控制点2纬度)
+    """
+    sin = math.sin
+    cos = math.cos
+    atan2 = math.atan2
+    sqrt = math.sqrt
+    hypot = math.hypot
+    radians = math.radians
+    
+    # 每个点的纬度余弦只计算一次，相邻两段共用
+    cos_lats = [cos(radians(lat)) for lat in lats]
+    
+    segments = []
+    for i in range(len(lngs) - 1):
+        start_lng, start_lat = lngs[i], lats[i]
+        end_lng, end_lat = lngs[i + 1], lats[i + 1]
+        
+        # 计算中点
+        mid_lng = (start_lng + end_lng) / 2
+        mid_lat = (start_lat + end_lat) / 2
+        
+        # 经纬度差同时用于距离和垂直方向计算
+        delta_lng = end_lng - start_lng
+        delta_lat = end_lat - start_lat
+        
+        # 内联Haversine距离计算，与_haversine结果一致
+        a = (sin(radians(delta_lat) / 2) ** 2 +
+             cos_lats[i] * cos_lats[i + 1] *
+             sin(radians(delta_lng) / 2) ** 2)
+        distance = EARTH_RADIUS_KM * (2 * atan2(sqrt(a), sqrt(1 - a)))
+        
+        # 根据距离调整控制点偏移，最大偏移0.5度
+        offset = min(distance * 0.2, 0.5)
+        
+        # 垂直于线段的单位向量为(-Δlat, Δlng)/|Δ|，无需先求方位角再取三角函数
+        length = hypot(delta_lng, delta_lat)
+        if length:
+            scale = offset * 0.5 / length
+            dx = -delta_lat * scale
+            dy = delta_lng * scale
+        else:
+            dx = dy = 0.0
+        
+        segments.append((mid_lng + dx, mid_lat + dy, mid_lng - dx, mid_lat - dy))
+    
+    return segments
+
+
+class LabelSpatialIndex:
+    """按左边界x排序的标签边界框索引，重叠检测只扫描x方向可能相交的区间"""
+    
+    def __init__(self):
+        self._xs: List[float] = []
+        # 与_xs一一对应的(右边界, 下边界, 上边界)，插入时算好，检测时只做比较
+        self._extents: List[Tuple[float, float, float]] = []
+        self._max_width = 0.0
+    
+    def overlaps(self, bounds: Dict) -> bool:
+        """检查边界框是否与已记录的任一边界框重叠"""
+        return self.overlaps_box(bounds['x'], bounds['y'], bounds['width'], bounds['height'])
+    
+    def overlaps_box(self, x: float, y: float, width: float, height: float) -> bool:
+        """按左下角坐标和宽高检查是否与已记录的任一边界框重叠"""
+        top = y + height
+        
+        # 左边界不大于x-max_width的框右边界不会超过x，不可能相交
+        start = bisect_left(self._xs, x - self._max_width)
+        end = bisect_left(self._xs, x + width)
+        
+        for right, bottom, other_top in self._extents[start:end]:
+            if x < right and y < other_top and top > bottom:
+                return True
+        return False
+    
+    def insert(self, bounds: Dict):
+        """记录一个已占用的边界框"""
+        x = bounds['x']
+        i = bisect_right(self._xs, x)
+        self._xs.insert(i, x)
+        self._extents.insert(i, (x + bounds['width'], bounds['y'], bounds['y'] + bounds['height']))
+        if bounds['width'] > self._max_width:
+            self._max_width = bounds['width']
+    
+    @classmethod
+    def from_bounds(cls, bounds_list: List[Dict]) -> "LabelSpatialIndex":
+        """由边界框列表构建索引"""
+        index = cls()
+        for bounds in bounds_list:
+            index.insert(bounds)
+        return index
+
+
+def _as_label_index(occupied_areas: Union[List[Dict], LabelSpatialIndex]) -> LabelSpatialIndex:
+    """兼容以边界框列表传入的已占用区域，列表包装为索引，不修改调用方的列表"""
+    if isinstance(occupied_areas, LabelSpatialIndex):
+        return occupied_areas
+    return LabelSpatialIndex.from_bounds(occupied_areas)
+
 
 class RouteGenerator:
     """路线生成服务"""
@@ -8,20 +160,34 @@ class RouteGenerator:
     def __init__(self):
         self.cache: Dict[str, RouteData] = {}
     
-    async def generate_route(self, coordinates: List[Coordinate]) -> RouteData:
-        """生成路线数据"""
+    async def generate_route(self, coordinates: List[Coordinate], packed: bool = False) -> RouteData:
+        """
+        生成路线数据
+        
+        Args:
+            coordinates: 地点坐标列表
+            packed: 为True时以列式packedPath返回路径点，不再逐点创建PathPoint对象
+        """
         try:
+            # 一次遍历得到经纬度范围和总和，供边界和中心点计算共用
+            extent = self._scan_coordinates(coordinates)
+            
             # 1. 计算地图边界
-            bounds = self.calculate_bounds(coordinates)
+            bounds = self.calculate_bounds(coordinates, extent)
             
             # 2. 计算地图中心点
-            center = self.calculate_center(coordinates)
+            center = self.calculate_center(coordinates, extent)
             
             # 3. 计算缩放级别
             zoom = self.calculate_zoom(bounds)
             
             # 4. 生成路径点
-            path_points = self.generate_path_points(coordinates)
+            if packed:
+                path_points = []
+                packed_path = self.generate_packed_path(coordinates)
+            else:
+                path_points = self.generate_path_points(coordinates)
+                packed_path = None
             
             # 5. 优化标签位置
             label_positions = self.optimize_label_positions(coordinates)
@@ -29,6 +195,7 @@ class RouteGenerator:
             route_data = RouteData(
                 coordinates=coordinates,
                 pathPoints=path_points,
+                packedPath=packed_path,
                 bounds=bounds,
                 center=center,
                 zoom=zoom,
@@ -40,18 +207,47 @@ class RouteGenerator:
         except Exception as e:
             raise Exception(f"路线生成失败: {str(e)}")
     
-    def calculate_bounds(self, coordinates: List[Coordinate]) -> MapBounds:
-        """计算地图边界"""
+    def _scan_coordinates(self, coordinates: List[Coordinate]) -> Tuple[float, float, float, float, float, float]:
+        """
+        单次遍历坐标列表
+        
+        Returns:
+            (min_lng, max_lng, min_lat, max_lat, sum_lng, sum_lat)
+        """
         if not coordinates:
             raise ValueError("坐标列表不能为空")
         
-        lngs = [coord.lng for coord in coordinates]
-        lats = [coord.lat for coord in coordinates]
+        first = coordinates[0]
+        min_lng = max_lng = first.lng
+        min_lat = max_lat = first.lat
+        sum_lng = sum_lat = 0.0
+        
+        for coord in coordinates:
+            lng = coord.lng
+            lat = coord.lat
+            if lng < min_lng:
+                min_lng = lng
+            elif lng > max_lng:
+                max_lng = lng
+            if lat < min_lat:
+                min_lat = lat
+            elif lat > max_lat:
+                max_lat = lat
+            sum_lng += lng
+            sum_lat += lat
+        
+        return min_lng, max_lng, min_lat, max_lat, sum_lng, sum_lat
+    
+    def calculate_bounds(
+        self,
+        coordinates: List[Coordinate],
+        extent: Optional[Tuple[float, float, float, float, float, float]] = None
+    ) -> MapBounds:
+        """计算地图边界"""
+        if not coordinates:
+            raise ValueError("坐标列表不能为空")
         
-        min_lng = min(lngs)
-        max_lng = max(lngs)
-        min_lat = min(lats)
-        max_lat = max(lats)
+        min_lng, max_lng, min_lat, max_lat, _, _ = extent or self._scan_coordinates(coordinates)
         
         # 添加10%的边距
         lng_padding = (max_lng - min_lng) * 0.1 if max_lng != min_lng else 0.01
@@ -73,13 +269,16 @@ class RouteGenerator:
         
         return MapBounds(southwest=southwest, northeast=northeast)
     
-    def calculate_center(self, coordinates: List[Coordinate]) -> Coordinate:
+    def calculate_center(
+        self,
+        coordinates: List[Coordinate],
+        extent: Optional[Tuple[float, float, float, float, float, float]] = None
+    ) -> Coordinate:
         """计算地图中心点"""
         if not coordinates:
             raise ValueError("坐标列表不能为空")
         
-        total_lng = sum(coord.lng for coord in coordinates)
-        total_lat = sum(coord.lat for coord in coordinates)
+        _, _, _, _, total_lng, total_lat = extent or self._scan_coordinates(coordinates)
         
         center_lng = total_lng / len(coordinates)
         center_lat = total_lat / len(coordinates)
@@ -118,160 +317,144 @@ class RouteGenerator:
         if len(coordinates) < 2:
             return []
         
-        path_points = []
+        lngs = [coord.lng for coord in coordinates]
+        lats = [coord.lat for coord in coordinates]
         
-        for i in range(len(coordinates) - 1):
-            start = coordinates[i]
-            end = coordinates[i + 1]
-            
-            # 添加起始点
-            path_points.append(PathPoint(
-                lng=start.lng,
-                lat=start.lat,
-                type='start',
-                index=i * 3
-            ))
-            
-            # 生成贝塞尔曲线控制点
-            control_points = self.generate_bezier_control_points(start, end)
-            
-            for j, control_point in enumerate(control_points):
-                path_points.append(PathPoint(
-                    lng=control_point['lng'],
-                    lat=control_point['lat'],
-                    type='control',
-                    index=i * 3 + j + 1
-                ))
-        
-        # 添加最后一个点
-        last_coord = coordinates[-1]
-        path_points.append(PathPoint(
-            lng=last_coord.lng,
-            lat=last_coord.lat,
-            type='end',
-            index=len(path_points)
-        ))
-        
-        return path_points
+        # 每段包含起始点和两个控制点，最后再加终点，按索引直接写入预分配列表
+        last = (len(coordinates) - 1) * 3
+        points: List[Optional[Dict]] = [None] * (last + 1)
+        
+        for i, (c1_lng, c1_lat, c2_lng, c2_lat) in enumerate(_segment_control_points(lngs, lats)):
+            base = i * 3
+            points[base] = {'lng': lngs[i], 'lat': lats[i], 'type': 'start', 'index': base}
+            points[base + 1] = {'lng': c1_lng, 'lat': c1_lat, 'type': 'control', 'index': base + 1}
+            points[base + 2] = {'lng': c2_lng, 'lat': c2_lat, 'type': 'control', 'index': base + 2}
+        
+        points[last] = {'lng': lngs[-1], 'lat': lats[-1], 'type': 'end', 'index': last}
+        
+        return _PATH_POINTS_ADAPTER.validate_python(points)
     
-    def generate_bezier_control_points(self, start: Coordinate, end: Coordinate) -> List[Dict]:
-        """生成贝塞尔曲线控制点"""
-        # 计算中点
-        mid_lng = (start.lng + end.lng) / 2
-        mid_lat = (start.lat + end.lat) / 2
+    def generate_packed_path(self, coordinates: List[Coordinate]) -> PackedPath:
+        """生成列式路径点，点序和索引与generate_path_points一致"""
+        if len(coordinates) < 2:
+            return PackedPath()
+        
+        coord_lngs = [coord.lng for coord in coordinates]
+        coord_lats = [coord.lat for coord in coordinates]
         
-        # 计算距离
-        distance = self.calculate_distance(start, end)
+        lngs: List[float] = []
+        lats: List[float] = []
         
-        # 根据距离调整控制点偏移
-        offset = min(distance * 0.2, 0.5)  # 最大偏移0.5度
+        for i, (c1_lng, c1_lat, c2_lng, c2_lat) in enumerate(_segment_control_points(coord_lngs, coord_lats)):
+            lngs += (coord_lngs[i], c1_lng, c2_lng)
+            lats += (coord_lats[i], c1_lat, c2_lat)
         
-        # 计算垂直方向的偏移
-        angle = math.atan2(end.lat - start.lat, end.lng - start.lng)
-        perpendicular_angle = angle + math.pi / 2
+        lngs.append(coord_lngs[-1])
+        lats.append(coord_lats[-1])
         
-        control_point_1 = {
-            'lng': mid_lng + offset * math.cos(perpendicular_angle) * 0.5,
-            'lat': mid_lat + offset * math.sin(perpendicular_angle) * 0.5
-        }
+        segment_count = len(coordinates) - 1
+        types = ['start', 'control', 'control'] * segment_count + ['end']
         
-        control_point_2 = {
-            'lng': mid_lng - offset * math.cos(perpendicular_angle) * 0.5,
-            'lat': mid_lat - offset * math.sin(perpendicular_angle) * 0.5
-        }
+        return PackedPath(lng=lngs, lat=lats, type=types, index=list(range(len(lngs))))
+    
+    def generate_bezier_control_points(self, start: Coordinate, end: Coordinate) -> List[Dict]:
+        """生成贝塞尔曲线控制点"""
+        c1_lng, c1_lat, c2_lng, c2_lat = _segment_control_points(
+            [start.lng, end.lng], [start.lat, end.lat]
+        )[0]
         
-        return [control_point_1, control_point_2]
+        return [
+            {'lng': c1_lng, 'lat': c1_lat},
+            {'lng': c2_lng, 'lat': c2_lat}
+        ]
     
     def calculate_distance(self, coord1: Coordinate, coord2: Coordinate) -> float:
         """计算两点间距离（公里）"""
-        # 使用Haversine公式计算地球表面两点间的距离
-        R = 6371  # 地球半径（公里）
-        
-        lat1_rad = math.radians(coord1.lat)
-        lat2_rad = math.radians(coord2.lat)
-        delta_lat = math.radians(coord2.lat - coord1.lat)
-        delta_lng = math.radians(coord2.lng - coord1.lng)
-        
-        a = (math.sin(delta_lat / 2) ** 2 + 
-             math.cos(lat1_rad) * math.cos(lat2_rad) * 
-             math.sin(delta_lng / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        return _haversine(coord1.lng, coord1.lat, coord2.lng, coord2.lat)
     
     def optimize_label_positions(self, coordinates: List[Coordinate]) -> List[LabelPosition]:
         """优化标签位置，避免重叠"""
         label_positions = []
-        occupied_areas = []
+        occupied_areas = LabelSpatialIndex()
         
         for coord in coordinates:
-            best_position = self.find_best_label_position(coord, occupied_areas)
-            label_positions.append(best_position)
+            # 候选位置只用坐标数值比较，全部选定后再统一创建LabelPosition
+            position, offset_x, offset_y, bounds = self._place_label(
+                coord.lng, coord.lat, coord.name, occupied_areas
+            )
+            label_positions.append({
+                'lng': coord.lng,
+                'lat': coord.lat,
+                'name': coord.name,
+                'offset_x': offset_x,
+                'offset_y': offset_y,
+                'position': position
+            })
             
             # 记录占用区域
-            bounds = self.get_label_bounds(best_position)
-            occupied_areas.append(bounds)
+            occupied_areas.insert(bounds)
         
-        return label_positions
+        return _LABEL_POSITIONS_ADAPTER.validate_python(label_positions)
     
-    def find_best_label_position(self, coordinate: Coordinate, occupied_areas: List[Dict]) -> LabelPosition:
-        """为坐标点找到最佳标签位置"""
-        positions = ['top', 'right', 'bottom', 'left']
-        offsets = {
-            'top': (0, 20),
-            'right': (20, 0),
-            'bottom': (0, -20),
-            'left': (-20, 0)
-        }
-        
-        for position in positions:
-            offset_x, offset_y = offsets[position]
-            label_position = LabelPosition(
-                lng=coordinate.lng,
-                lat=coordinate.lat,
-                name=coordinate.name,
-                offset_x=offset_x,
-                offset_y=offset_y,
-                position=position
-            )
-            
-            bounds = self.get_label_bounds(label_position)
-            if not self.is_overlapping(bounds, occupied_areas):
-                return label_position
+    def _place_label(
+        self,
+        lng: float,
+        lat: float,
+        name: str,
+        occupied_areas: LabelSpatialIndex
+    ) -> Tuple[str, float, float, Dict]:
+        """
+        依次尝试候选方位，返回第一个不重叠的位置
+        
+        Returns:
+            (方位, X轴偏移量, Y轴偏移量, 边界框)
+        """
+        # 宽度每个标签只算一次，候选位置直接用坐标数值检测，选定后才构建边界框
+        width = _label_width(name)
+        
+        for position, offset_x, offset_y in _LABEL_CANDIDATES:
+            if not occupied_areas.overlaps_box(
+                lng + offset_x * 0.001, lat + offset_y * 0.001, width, _LABEL_HEIGHT
+            ):
+                break
+        else:
+            # 如果所有位置都重叠，返回默认位置
+            position, offset_x, offset_y = _LABEL_CANDIDATES[0]
+        
+        return position, offset_x, offset_y, _label_bounds(lng, lat, width, offset_x, offset_y)
+    
+    def find_best_label_position(
+        self,
+        coordinate: Coordinate,
+        occupied_areas: Union[List[Dict], LabelSpatialIndex]
+    ) -> LabelPosition:
+        """为坐标点找到最佳标签位置，已占用区域可为边界框列表或标签索引"""
+        position, offset_x, offset_y, _ = self._place_label(
+            coordinate.lng, coordinate.lat, coordinate.name, _as_label_index(occupied_areas)
+        )
         
-        # 如果所有位置都重叠，返回默认位置
         return LabelPosition(
             lng=coordinate.lng,
             lat=coordinate.lat,
             name=coordinate.name,
-            offset_x=0,
-            offset_y=20,
-            position='top'
+            offset_x=offset_x,
+            offset_y=offset_y,
+            position=position
         )
     
     def get_label_bounds(self, label_position: LabelPosition) -> Dict:
         """获取标签的边界框"""
-        # 估算标签尺寸（基于文本长度）
-        text_length = len(label_position.name)
-        width = max(0.01, text_length * 0.002)  # 根据文本长度估算宽度
-        height = 0.005  # 固定高度
-        
-        return {
-            'x': label_position.lng + label_position.offset_x * 0.001,
-            'y': label_position.lat + label_position.offset_y * 0.001,
-            'width': width,
-            'height': height
-        }
+        return _label_bounds(
+            label_position.lng,
+            label_position.lat,
+            _label_width(label_position.name),
+            label_position.offset_x,
+            label_position.offset_y
+        )
     
-    def is_overlapping(self, bounds1: Dict, occupied_areas: List[Dict]) -> bool:
-        """检查边界框是否与已占用区域重叠"""
-        for bounds2 in occupied_areas:
-            if (bounds1['x'] < bounds2['x'] + bounds2['width'] and
-                bounds1['x'] + bounds1['width'] > bounds2['x'] and
-                bounds1['y'] < bounds2['y'] + bounds2['height'] and
-                bounds1['y'] + bounds1['height'] > bounds2['y']):
-                return True
-        return False
+    def is_overlapping(self, bounds1: Dict, occupied_areas: Union[List[Dict], LabelSpatialIndex]) -> bool:
+        """检查边界框是否与已占用区域重叠，已占用区域可为边界框列表或标签索引"""
+        return _as_label_index(occupied_areas).overlaps(bounds1)
     
     def optimize_layout(self, route: RouteData) -> RouteData:
         """优化整体布局"""
@@ -6,17 +6,29 @@
 import os
 import yaml
 import logging
-from typing import Dict, Any, Optional, List
+from functools import lru_cache
+from typing import Dict, Any, Optional, Union
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# 优先使用libyaml的C实现读写配置
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+# 默认配置文件路径
+_DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[2] / 'config' / 'llm_config.yaml'
+
 
 class ConfigValidationError(Exception):
     """配置验证错误"""
     pass
 
 
+# 允许整数或浮点数的字段类型
+INT_OR_FLOAT = (int, float)
+
+
 class ConfigValidator:
     """配置文件验证器"""
     
@@ -33,7 +45,7 @@ class ConfigValidator:
         'llm.api_url': str,
         'llm.model': str,
         'llm.max_tokens': int,
-        'llm.temperature': (int, float),
+        'llm.temperature': INT_OR_FLOAT,
         'llm.timeout': int,
         'route_planning.max_locations': int,
         'route_planning.default_style': str,
@@ -53,17 +65,22 @@ class ConfigValidator:
     
     # 允许的枚举值
     FIELD_ENUMS = {
-        'route_planning.default_style': ['artistic', 'realistic', 'minimalist', 'vintage'],
-        'geo_service.provider': ['openstreetmap', 'google', 'baidu']
+        'route_planning.default_style': frozenset({'artistic', 'realistic', 'minimalist', 'vintage'}),
+        'geo_service.provider': frozenset({'openstreetmap', 'google', 'baidu'})
     }
     
     @classmethod
-    def validate_config_file(cls, config_path: str) -> Dict[str, Any]:
+    def validate_config_file(
+        cls,
+        config_path: Union[str, os.PathLike],
+        check_permissions: bool = True
+    ) -> Dict[str, Any]:
         """
         验证并加载配置文件
         
         Args:
             config_path: 配置文件路径
+            check_permissions: 是否检查文件权限，调用方已检查过时传False
             
         Returns:
             验证后的配置字典
@@ -71,32 +88,27 @@ class ConfigValidator:
         Raises:
             ConfigValidationError: 配置验证失败
         """
+        path = Path(config_path)
         try:
-            # 检查文件是否存在
-            if not os.path.exists(config_path):
+            # 检查文件是否存在，同一次stat的结果用于权限检查
+            try:
+                file_stat = path.stat()
+            except FileNotFoundError:
                 raise ConfigValidationError(f"配置文件不存在: {config_path}")
             
             # 检查文件权限
-            cls._check_file_permissions(config_path)
+            if check_permissions:
+                cls._check_file_permissions(file_stat)
             
-            # 加载YAML文件
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+            # 加载YAML文件：以二进制方式直接交给解析器，由libyaml读取并识别编码
+            with path.open('rb') as f:
+                config = yaml.load(f, Loader=_YAML_LOADER)
             
             if not config:
                 raise ConfigValidationError("配置文件为空或格式错误")
             
-            # 验证配置结构
-            cls._validate_structure(config)
-            
-            # 验证字段类型
-            cls._validate_types(config)
-            
-            # 验证字段值范围
-            cls._validate_ranges(config)
-            
-            # 验证枚举值
-            cls._validate_enums(config)
+            # 验证配置结构、字段类型、值范围和枚举值
+            cls._validate_fields(config)
             
             # 验证业务逻辑
             cls._validate_business_logic(config)
@@ -112,9 +124,8 @@ class ConfigValidator:
             raise ConfigValidationError(f"配置文件验证失败: {e}")
     
     @classmethod
-    def _check_file_permissions(cls, config_path: str):
+    def _check_file_permissions(cls, file_stat: os.stat_result):
         """检查配置文件权限"""
-        file_stat = os.stat(config_path)
         file_mode = file_stat.st_mode & 0o777
         
         # 检查文件权限是否过于宽松（不应该对组和其他用户可读）
@@ -122,87 +133,107 @@ class ConfigValidator:
             logger.warning(f"配置文件权限过于宽松: {oct(file_mode)}, 建议设置为600")
     
     @classmethod
-    def _validate_structure(cls, config: Dict[str, Any]):
-        """验证配置结构"""
-        for section, required_fields in cls.REQUIRED_FIELDS.items():
-            if section not in config:
-                raise ConfigValidationError(f"缺少必需的配置节: {section}")
-            
-            section_config = config[section]
-            if not isinstance(section_config, dict):
-                raise ConfigValidationError(f"配置节必须是字典类型: {section}")
-            
-            for field in required_fields:
-                if field not in section_config:
-                    raise ConfigValidationError(f"缺少必需的配置字段: {section}.{field}")
+    def _compile_rules(cls) -> Dict[str, tuple]:
+        """
+        将必需字段、类型、范围和枚举规则合并，并按顶层配置节分组
+        
+        每条规则为 (字段路径, 字段名, 是否必需, 期望类型, 精确类型集合, 取值范围, 允许值集合)，
+        无对应规则的项为None；精确类型集合供类型检查走集合查找的快速路径
+        """
+        required_paths = [
+            f"{section}.{field}"
+            for section, fields in cls.REQUIRED_FIELDS.items()
+            for field in fields
+        ]
+        required = set(required_paths)
+        
+        rules_by_section: Dict[str, list] = {section: [] for section in cls.REQUIRED_FIELDS}
+        for field_path in dict.fromkeys(
+            [*required_paths, *cls.FIELD_TYPES, *cls.FIELD_RANGES, *cls.FIELD_ENUMS]
+        ):
+            section, field = field_path.split('.', 1)
+            expected_type = cls.FIELD_TYPES.get(field_path)
+            if expected_type is None:
+                exact_types = None
+            else:
+                exact_types = frozenset(expected_type if isinstance(expected_type, tuple) else (expected_type,))
+            rules_by_section.setdefault(section, []).append((
+                field_path,
+                field,
+                field_path in required,
+                expected_type,
+                exact_types,
+                cls.FIELD_RANGES.get(field_path),
+                cls.FIELD_ENUMS.get(field_path)
+            ))
+        return {section: tuple(rules) for section, rules in rules_by_section.items()}
     
     @classmethod
-    def _validate_types(cls, config: Dict[str, Any]):
-        """验证字段类型"""
-        for field_path, expected_type in cls.FIELD_TYPES.items():
-            value = cls._get_nested_value(config, field_path)
-            if value is not None:
-                if not isinstance(value, expected_type):
+    def _validate_fields(cls, config: Dict[str, Any]):
+        """一次遍历验证配置结构、字段类型、值范围和枚举值，每个字段直接在所属配置节中查找"""
+        for section, rules in cls._RULES_BY_SECTION.items():
+            section_config = config.get(section)
+            if section in cls.REQUIRED_FIELDS:
+                if section not in config:
+                    raise ConfigValidationError(f"缺少必需的配置节: {section}")
+                if not isinstance(section_config, dict):
+                    raise ConfigValidationError(f"配置节必须是字典类型: {section}")
+            elif not isinstance(section_config, dict):
+                continue
+            
+            for field_path, field, required, expected_type, exact_types, value_range, allowed_values in rules:
+                if required and field not in section_config:
+                    raise ConfigValidationError(f"缺少必需的配置字段: {field_path}")
+                
+                value = section_config.get(field)
+                if value is None:
+                    continue
+                
+                # 合法配置的值类型与期望类型完全一致，先做集合查找，子类再回退到isinstance
+                if (
+                    exact_types is not None
+                    and type(value) not in exact_types
+                    and not isinstance(value, expected_type)
+                ):
                     raise ConfigValidationError(
                         f"字段类型错误: {field_path}, 期望 {expected_type}, 实际 {type(value)}"
                     )
-    
-    @classmethod
-    def _validate_ranges(cls, config: Dict[str, Any]):
-        """验证字段值范围"""
-        for field_path, (min_val, max_val) in cls.FIELD_RANGES.items():
-            value = cls._get_nested_value(config, field_path)
-            if value is not None:
-                if not (min_val <= value <= max_val):
-                    raise ConfigValidationError(
-                        f"字段值超出范围: {field_path}={value}, 允许范围 [{min_val}, {max_val}]"
-                    )
-    
-    @classmethod
-    def _validate_enums(cls, config: Dict[str, Any]):
-        """验证枚举值"""
-        for field_path, allowed_values in cls.FIELD_ENUMS.items():
-            value = cls._get_nested_value(config, field_path)
-            if value is not None:
-                if value not in allowed_values:
+                
+                if value_range is not None:
+                    min_val, max_val = value_range
+                    if not (min_val <= value <= max_val):
+                        raise ConfigValidationError(
+                            f"字段值超出范围: {field_path}={value}, 允许范围 [{min_val}, {max_val}]"
+                        )
+                
+                if allowed_values is not None and value not in allowed_values:
                     raise ConfigValidationError(
-                        f"字段值不在允许范围内: {field_path}={value}, 允许值 {allowed_values}"
+                        f"字段值不在允许范围内: {field_path}={value}, "
+                        f"允许值 {sorted(allowed_values)}"
                     )
     
     @classmethod
     def _validate_business_logic(cls, config: Dict[str, Any]):
         """验证业务逻辑"""
+        llm = config.get('llm') or {}
+        
         # 验证API URL格式
-        api_url = config.get('llm', {}).get('api_url', '')
-        if api_url and not (api_url.startswith('http://') or api_url.startswith('https://')):
+        api_url = llm.get('api_url', '')
+        if api_url and not api_url.startswith(('http://', 'https://')):
             raise ConfigValidationError(f"API URL格式错误: {api_url}")
         
         # 验证API密钥格式（不为空且长度合理）
-        api_key = config.get('llm', {}).get('api_key', '')
+        api_key = llm.get('api_key', '')
         if not api_key or len(api_key) < 10:
             raise ConfigValidationError("API密钥格式错误或过短")
         
         # 验证模型名称格式
-        model = config.get('llm', {}).get('model', '')
+        model = llm.get('model', '')
         if not model or len(model) < 3:
             raise ConfigValidationError("模型名称格式错误")
     
     @classmethod
-    def _get_nested_value(cls, config: Dict[str, Any], field_path: str) -> Any:
-        """获取嵌套字段值"""
-        keys = field_path.split('.')
-        value = config
-        
-        for key in keys:
-            if isinstance(value, dict) and key in value:
-                value = value[key]
-            else:
-                return None
-        
-        return value
-    
-    @classmethod
-    def create_example_config(cls, output_path: str):
+    def create_example_config(cls, output_path: Union[str, os.PathLike]):
         """创建示例配置文件"""
         example_config = {
             'llm': {
@@ -225,16 +256,36 @@ class ConfigValidator:
             }
         }
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            yaml.dump(example_config, f, default_flow_style=False, allow_unicode=True)
+        with Path(output_path).open('w', encoding='utf-8') as f:
+            yaml.dump(example_config, f, Dumper=_YAML_DUMPER, default_flow_style=False, allow_unicode=True)
         
         logger.info(f"示例配置文件已创建: {output_path}")
 
 
-def load_and_validate_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+# 规则表在类定义后构建一次，验证时无需重复拆分字段路径
+ConfigValidator._RULES_BY_SECTION = ConfigValidator._compile_rules()
+
+
+@lru_cache(maxsize=8)
+def _load_validated_config(config_path: Path, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """
+    加载并验证配置文件
+    
+    以真实路径、修改时间和文件大小为缓存键，同一进程内重复加载未修改的文件直接返回缓存结果；
+    返回的字典在调用方之间共享，调用方只读不写；文件权限由调用方在缓存外检查
+    """
+    return ConfigValidator.validate_config_file(config_path, check_permissions=False)
+
+
+def load_and_validate_config(config_path: Optional[Union[str, os.PathLike]] = None) -> Dict[str, Any]:
     """
     加载并验证配置文件的便捷函数
     
+    同一进程内重复加载未修改的配置文件时跳过YAML解析和验证，但每次都会检查文件权限；
+    设置环境变量 CACHE_DISABLE=1 时每次都重新验证，不使用缓存。
+    同一进程内的重复调用返回共享的配置字典，调用方不应修改，
+    需要重新加载时调用 clear_config_cache()
+    
     Args:
         config_path: 配置文件路径，如果为None则使用默认路径
         
@@ -242,13 +293,28 @@ def load_and_validate_config(config_path: Optional[str] = None) -> Dict[str, Any
         验证后的配置字典
     """
     if config_path is None:
-        # 默认配置文件路径
-        config_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            'config', 'llm_config.yaml'
-        )
+        config_path = _DEFAULT_CONFIG_PATH
     
-    return ConfigValidator.validate_config_file(config_path)
+    real_path = Path(config_path).resolve()
+    try:
+        file_stat = real_path.stat()
+    except OSError:
+        # 文件不存在等情况交给验证器给出统一的错误信息
+        return ConfigValidator.validate_config_file(config_path)
+    
+    # chmod不改变修改时间、大小和内容，权限在缓存外每次检查一次
+    ConfigValidator._check_file_permissions(file_stat)
+    
+    # 环境变量在缓存外判断，已缓存的结果不会绕过该开关
+    if os.environ.get('CACHE_DISABLE') == '1':
+        return ConfigValidator.validate_config_file(real_path, check_permissions=False)
+    
+    return _load_validated_config(real_path, file_stat.st_mtime_ns, file_stat.st_size)
+
+
+def clear_config_cache():
+    """清空进程内已验证配置的缓存，下次加载时重新读取并验证"""
+    _load_validated_config.cache_clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,33 @@
+"""
+请求限速工具
+提供按固定速率放行请求的异步限速器
+"""
+
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """按固定速率放行请求的限速器，超出速率的请求排队等待"""
+
+    def __init__(self, rate: float, period: float = 1.0):
+        """
+        初始化限速器
+
+        Args:
+            rate: 每个周期内最多放行的请求数
+            period: 周期长度（秒）
+        """
+        self.interval = period / rate
+        self._next_slot = 0.0
+
+    async def acquire(self):
+        """等待到下一个可用的放行时刻"""
+        now = time.monotonic()
+        # 同步预约放行时刻，协程间无需加锁
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -1,50 +1,114 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.api import router
+from app.api.routes import close_services
 from app.api.ai_routes import router as ai_router
-from app.config import config
-
-# 获取应用配置
-app_config = config.get_app_config()
-
-# 创建FastAPI应用
-app = FastAPI(
-    title=app_config.get('title', 'Travel Route Map API'),
-    version=app_config.get('version', '1.0.0'),
-    description="旅游路线图生成工具的后端API服务",
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
-
-# 配置CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:3001", "http://127.0.0.1:3001"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# 注册路由
-app.include_router(router, prefix="/api/v1", tags=["location"])
-app.include_router(ai_router)
-
-@app.get("/")
-async def root():
-    """根路径，返回API信息"""
-    return {
-        "message": "Travel Route Map API",
-        "version": app_config.get('version', '1.0.0'),
-        "docs": "/docs",
-        "health": "/api/v1/health"
-    }
+from app.config import get_config
+from app.services.llm_service import close_llm_service, get_llm_service
+from app.services.llm_batcher import close_batched_llm_client
+from app.utils.config_validator import ConfigValidationError
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期管理"""
+    # 启动时创建LLM服务并在后台预热连接，不阻塞服务启动；
+    # LLM配置缺失时其余接口仍可使用
+    warmup_task = None
+    try:
+        warmup_task = asyncio.create_task(get_llm_service().warmup())
+    except ConfigValidationError as e:
+        logger.warning("LLM服务不可用: %s", e)
+    yield
+    if warmup_task:
+        warmup_task.cancel()
+    # 关闭时停止LLM批处理后台任务，并释放LLM和高德API连接池
+    await close_batched_llm_client()
+    await close_llm_service()
+    await close_services()
+
+@lru_cache(maxsize=1)
+def create_app() -> FastAPI:
+    """创建FastAPI应用，首次调用时读取配置并注册中间件和路由，之后返回同一实例"""
+    app_config = get_config().get_app_config()
+    max_body_bytes = get_config().get_limits().max_body_bytes
+
+    app = FastAPI(
+        title=app_config.title,
+        version=app_config.version,
+        description="旅游路线图生成工具的后端API服务",
+        docs_url="/docs",
+        redoc_url="/redoc",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+
+    @app.middleware("http")
+    async def limit_body_size(request: Request, call_next):
+        """请求体超过上限时直接返回413，不再读取和解析请求体"""
+        content_length = request.headers.get("content-length")
+        if content_length is not None:
+            try:
+                too_large = int(content_length) > max_body_bytes
+            except ValueError:
+                return ORJSONResponse({"detail": "无效的Content-Length"}, status_code=400)
+            if too_large:
+                return ORJSONResponse({"detail": "请求体过大"}, status_code=413)
+        return await call_next(request)
+
+    # 配置CORS（后注册的中间件在外层，413响应同样带CORS头）
+    app.add_middleware(
+        CORSMiddleware,
+        # 本地前端开发地址，用一个正则匹配代替逐个比较来源列表
+        allow_origin_regex=r"^http://(localhost|127\.0\.0\.1):(3000|3001)$",
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # 注册路由
+    app.include_router(router, prefix="/api/v1", tags=["location"])
+    app.include_router(ai_router)
+
+    @app.get("/")
+    async def root():
+        """根路径，返回API信息"""
+        return {
+            "message": "Travel Route Map API",
+            "version": app_config.version,
+            "docs": "/docs",
+            "health": "/api/v1/health"
+        }
+
+    return app
+
+# uvicorn通过"main:app"加载的应用实例
+app = create_app()
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     
+    app_config = get_config().get_app_config()
     uvicorn.run(
         "main:app",
-        host=app_config.get('host', '0.0.0.0'),
-        port=app_config.get('port', 8000),
-        reload=app_config.get('debug', True)
+        host=app_config.host,
+        port=app_config.port,
+        reload=app_config.debug,
+        # 显式使用uvloop事件循环和httptools解析器（由uvicorn[standard]提供），
+        # 缺少依赖时启动即报错，而不是静默退回asyncio/h11；uvloop不支持Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        # 延长空闲连接保持时间，输入联想等连续小请求可复用同一TCP连接；
+        # uvicorn不支持HTTP/2，如需多路复用请在前置反向代理（如Caddy/Nginx）上开启h2
+        timeout_keep_alive=app_config.timeout_keep_alive,
+        # 多进程与reload互斥，开发模式（debug）下uvicorn只启动单个进程
+        workers=app_config.workers,
+        backlog=app_config.backlog
     )
\ No newline at end of file
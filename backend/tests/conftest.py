@@ -1,9 +1,12 @@
 import pytest
 import pytest_asyncio
 import asyncio
+from types import MappingProxyType
 from fastapi.testclient import TestClient
-from httpx import AsyncClient
-from main import app
+from httpx import ASGITransport, AsyncClient
+from main import create_app
+
+app = create_app()
 
 @pytest.fixture(scope="session")
 def event_loop():
@@ -13,21 +16,21 @@ def event_loop():
     yield loop
     loop.close()
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def client():
-    """创建测试客户端"""
+    """创建测试客户端，整个测试会话共享一个实例"""
     return TestClient(app)
 
-@pytest_asyncio.fixture
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
 async def async_client():
-    """创建异步测试客户端"""
-    async with AsyncClient(app=app, base_url="http://test") as ac:
+    """创建异步测试客户端，整个测试会话共享一个实例"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_locations():
-    """测试用的地名数据"""
-    return {
+    """测试用的地名数据，只读并在整个测试会话中共享"""
+    return MappingProxyType({
         "valid_input": "北京 上海 广州",
         "arrow_format": "北京→上海→广州",
         "comma_format": "北京，上海，广州",
@@ -38,4 +41,4 @@ def sample_locations():
         "too_many": "北京 上海 广州 深圳 杭州 南京 西安 成都 重庆",
         "duplicate": "北京 上海 北京",
         "invalid": "北京 火星 上海"
-    }
\ No newline at end of file
+    })
@@ -0,0 +1,45 @@
+import logging
+import os
+import pytest
+from app.utils.config_validator import ConfigValidator, clear_config_cache, load_and_validate_config
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """权限为600的示例配置文件，测试前后清空进程内缓存"""
+    path = tmp_path / "llm_config.yaml"
+    ConfigValidator.create_example_config(str(path))
+    os.chmod(path, 0o600)
+    clear_config_cache()
+    yield path
+    clear_config_cache()
+
+
+class TestLoadAndValidateConfig:
+    """配置加载缓存测试"""
+    
+    def test_permission_warning_on_cache_hit(self, config_path, caplog):
+        """测试配置已缓存后放宽文件权限仍会告警"""
+        load_and_validate_config(config_path)
+        
+        os.chmod(config_path, 0o644)
+        with caplog.at_level(logging.WARNING, logger="app.utils.config_validator"):
+            load_and_validate_config(config_path)
+        
+        assert caplog.text.count("权限过于宽松") == 1
+    
+    def test_permission_warning_logged_once_on_cache_miss(self, config_path, caplog):
+        """测试未命中缓存时权限告警只记录一次"""
+        os.chmod(config_path, 0o644)
+        with caplog.at_level(logging.WARNING, logger="app.utils.config_validator"):
+            load_and_validate_config(config_path)
+        
+        assert caplog.text.count("权限过于宽松") == 1
+    
+    def test_cache_disable_bypasses_memoized_result(self, config_path, monkeypatch):
+        """测试进程内已缓存后设置CACHE_DISABLE仍会重新验证"""
+        first = load_and_validate_config(config_path)
+        assert load_and_validate_config(config_path) is first
+        
+        monkeypatch.setenv("CACHE_DISABLE", "1")
+        assert load_and_validate_config(config_path) is not first
@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 from fastapi.testclient import TestClient
+import httpx
 from httpx import AsyncClient
 
 class TestLocationParserIntegration:
@@ -10,6 +11,7 @@ class TestLocationParserIntegration:
         """测试健康检查接口"""
         response = client.get("/api/v1/health")
         assert response.status_code == 200
+        assert "max-age" in response.headers["cache-control"]
         
         data = response.json()
         assert data["status"] == "healthy"
@@ -17,6 +19,61 @@ class TestLocationParserIntegration:
         assert "timestamp" in data
         assert "dependencies" in data
     
+    def test_ai_health_unhealthy_not_cached(self, client: TestClient, monkeypatch):
+        """测试AI健康检查异常时不返回缓存头"""
+        from app.api import ai_routes
+        
+        def broken_llm_service():
+            raise RuntimeError("配置缺失")
+        
+        monkeypatch.setattr(ai_routes, "get_llm_service", broken_llm_service)
+        response = client.get("/api/v1/ai/health")
+        
+        assert response.json()["status"] == "unhealthy"
+        assert "cache-control" not in response.headers
+    
+    @pytest.mark.asyncio
+    async def test_route_stream_releases_llm_slot_while_yielding(self, monkeypatch):
+        """测试流式路线推送地点期间不占用LLM并发名额"""
+        from app.api import ai_routes
+        from app.services.llm_service import LocationInfo
+        
+        monkeypatch.setattr(ai_routes, "_llm_semaphore", asyncio.Semaphore(1))
+        location = LocationInfo(name="北京", display_name="北京", coordinates=[116.4, 39.9], type="city")
+        
+        class StubService:
+            async def parse_locations_stream(self, user_input):
+                yield location
+                yield location
+        
+        response = await ai_routes.generate_route_stream(
+            ai_routes.RouteRequest(user_input="北京 北京"),
+            llm_service=StubService()
+        )
+        first = await anext(response.body_iterator)
+        
+        assert b'"location"' in first
+        assert not ai_routes._llm_semaphore.locked()
+        await response.body_iterator.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_geocoder_client_replaced_on_new_loop_is_closed(self):
+        """测试事件循环变化时替换下来的旧高德客户端被关闭"""
+        from app.services.location_parser import LocationParser
+        
+        old_loop = asyncio.new_event_loop()
+        old_loop.close()
+        parser = LocationParser()
+        old_client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        parser._client = old_client
+        parser._client_loop = old_loop
+        
+        assert parser._get_client() is not old_client
+        await asyncio.gather(*parser._closing_tasks)
+        
+        assert old_client.is_closed
+        await parser.aclose()
+    
     def test_root_endpoint(self, client: TestClient):
         """测试根路径接口"""
         response = client.get("/")
@@ -27,7 +84,7 @@ class TestLocationParserIntegration:
         assert "version" in data
         assert "docs" in data
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_parse_valid_locations_real_api(self, async_client: AsyncClient, sample_locations):
         """测试有效地名解析 - 使用真实API"""
         test_cases = [
@@ -70,7 +127,7 @@ class TestLocationParserIntegration:
                     assert isinstance(coord["lat"], (int, float))
                     assert coord["level"] in ["province", "city", "district"]
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_parse_alias_locations_real_api(self, async_client: AsyncClient, sample_locations):
         """测试别名地名解析 - 使用真实API"""
         response = await async_client.post(
@@ -89,7 +146,7 @@ class TestLocationParserIntegration:
             assert "魔都" in locations or "上海" in str(parse_result)
             assert "花城" in locations or "广州" in str(parse_result)
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_parse_error_cases(self, async_client: AsyncClient, sample_locations):
         """测试错误情况处理"""
         error_cases = [
@@ -116,7 +173,7 @@ class TestLocationParserIntegration:
                 errors = data["data"]["errors"]
                 assert any(expected_error in error for error in errors), f"Expected '{expected_error}' in errors: {errors}"
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_parse_invalid_input(self, async_client: AsyncClient):
         """测试无效输入处理"""
         invalid_inputs = [
@@ -134,7 +191,7 @@ class TestLocationParserIntegration:
             # 应该返回400或422状态码
             assert response.status_code in [400, 422]
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_suggest_corrections(self, async_client: AsyncClient, sample_locations):
         """测试建议修正接口"""
         response = await async_client.get(
@@ -149,7 +206,7 @@ class TestLocationParserIntegration:
         assert "message" in data
         assert isinstance(data["suggestions"], list)
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_concurrent_requests(self, async_client: AsyncClient, sample_locations):
         """测试并发请求处理"""
         # 创建多个并发请求
@@ -170,7 +227,7 @@ class TestLocationParserIntegration:
             data = response.json()
             assert "success" in data
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_api_response_time(self, async_client: AsyncClient, sample_locations):
         """测试API响应时间"""
         import time
@@ -187,6 +244,34 @@ class TestLocationParserIntegration:
         assert response_time < 5.0
         assert response.status_code == 200
     
+    def test_oversized_body_rejected(self, client: TestClient):
+        """测试超大请求体直接返回413"""
+        response = client.post(
+            "/api/v1/parse",
+            content=b"x" * 20000,
+            headers={"Content-Type": "application/json"}
+        )
+        assert response.status_code == 413
+    
+    def test_generate_route_msgpack(self, client: TestClient):
+        """测试按Accept头返回MessagePack编码的路线"""
+        import ormsgpack
+        
+        response = client.post(
+            "/api/v1/generate-route",
+            json={"coordinates": [
+                {"lng": 116.4074, "lat": 39.9042, "name": "北京", "level": "city"},
+                {"lng": 121.4737, "lat": 31.2304, "name": "上海", "level": "city"}
+            ]},
+            headers={"Accept": "application/msgpack"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/msgpack"
+        
+        data = ormsgpack.unpackb(response.content)
+        assert data["success"] is True
+        assert len(data["data"]["coordinates"]) == 2
+    
     def test_cors_headers(self, client: TestClient):
         """测试CORS头设置"""
         # 测试实际的API端点而不是OPTIONS请求
@@ -199,7 +284,7 @@ class TestLocationParserIntegration:
 class TestRealServiceIntegration:
     """真实服务集成测试"""
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_amap_api_integration(self, async_client: AsyncClient):
         """测试与高德地图API的真实集成"""
         # 使用知名地点进行测试
@@ -230,7 +315,7 @@ class TestRealServiceIntegration:
                     assert 73 <= lng <= 135  # 经度范围
                     assert 18 <= lat <= 54   # 纬度范围
     
-    @pytest.mark.asyncio
+    @pytest.mark.asyncio(loop_scope="session")
     async def test_service_availability(self, async_client: AsyncClient):
         """测试服务可用性"""
         # 测试服务是否正常运行
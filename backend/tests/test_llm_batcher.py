@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from app.services.llm_batcher import BatchedLLMClient
+
+
+class StubService:
+    """记录批量调用的LLM服务替身，每条输入返回只含该输入的结果"""
+    
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+        # 未设置时立即返回，测试可清除该事件让调用挂起
+        self.release = asyncio.Event()
+        self.release.set()
+    
+    async def parse_locations_batch(self, user_inputs):
+        self.calls.append(list(user_inputs))
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return [[text] for text in user_inputs]
+
+
+class TestBatchedLLMClient:
+    """LLM批处理客户端测试"""
+    
+    @pytest.mark.asyncio
+    async def test_requests_in_window_share_one_call(self):
+        """测试时间窗口内的请求合并为一次调用，结果按输入顺序分发"""
+        service = StubService()
+        client = BatchedLLMClient(service, max_batch_size=8, max_wait_ms=50)
+        
+        results = await asyncio.gather(*[client.parse(text) for text in ("北京", "上海", "广州")])
+        
+        assert service.calls == [["北京", "上海", "广州"]]
+        assert results == [["北京"], ["上海"], ["广州"]]
+        await client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_batch_error_reaches_every_caller(self):
+        """测试批量调用失败时同批的每个请求都收到异常"""
+        service = StubService(error=RuntimeError("LLM不可用"))
+        client = BatchedLLMClient(service, max_batch_size=8, max_wait_ms=50)
+        
+        results = await asyncio.gather(
+            *[client.parse(text) for text in ("北京", "上海")],
+            return_exceptions=True
+        )
+        
+        assert len(service.calls) == 1
+        assert all(isinstance(result, RuntimeError) for result in results)
+        await client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_keeps_shared_result(self):
+        """测试取消一个调用方不会取消共享同一结果的其他请求"""
+        service = StubService()
+        service.release.clear()
+        client = BatchedLLMClient(service, max_batch_size=8, max_wait_ms=10)
+        
+        first = asyncio.create_task(client.parse("北京"))
+        second = asyncio.create_task(client.parse("北京"))
+        await asyncio.sleep(0.05)
+        
+        first.cancel()
+        await asyncio.sleep(0)
+        service.release.set()
+        
+        assert await second == ["北京"]
+        assert first.cancelled()
+        await client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_aclose_fails_pending_requests(self):
+        """测试关闭时分发中和排队中的请求以异常结束而不是一直等待"""
+        service = StubService()
+        service.release.clear()
+        client = BatchedLLMClient(service, max_batch_size=1, max_wait_ms=10)
+        
+        tasks = [asyncio.create_task(client.parse(text)) for text in ("北京", "上海")]
+        await asyncio.sleep(0.05)
+        
+        await client.aclose()
+        results = await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 1)
+        
+        assert all(isinstance(result, RuntimeError) for result in results)
+    
+    @pytest.mark.asyncio
+    async def test_same_input_shares_inflight_request(self):
+        """测试去除首尾空白后相同的并发输入只调用一次，完成后释放进行中的键"""
+        service = StubService()
+        client = BatchedLLMClient(service, max_batch_size=8, max_wait_ms=20)
+        
+        results = await asyncio.gather(client.parse("北京"), client.parse("  北京 "))
+        
+        assert service.calls == [["北京"]]
+        assert results == [["北京"], ["北京"]]
+        assert client._inflight == {}
+        
+        # 键释放后再次请求会重新调用
+        await client.parse("北京")
+        assert len(service.calls) == 2
+        await client.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_inflight_key_released_after_failure(self):
+        """测试请求失败后释放进行中的键，后续请求不会复用失败结果"""
+        service = StubService(error=RuntimeError("LLM不可用"))
+        client = BatchedLLMClient(service, max_batch_size=8, max_wait_ms=20)
+        
+        results = await asyncio.gather(client.parse("北京"), client.parse("北京 "), return_exceptions=True)
+        
+        assert service.calls == [["北京"]]
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert client._inflight == {}
+        
+        service.error = None
+        assert await client.parse("北京") == ["北京"]
+        await client.aclose()
@@ -0,0 +1,408 @@
+import asyncio
+import httpx
+import orjson
+import pytest
+from app.services import llm_service as llm_service_module
+from app.services.location_parser import LocationParser
+from app.services.llm_service import LLMService, LocationInfo, _LocationItemScanner, _extract_json_str
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """最小LLM配置文件"""
+    path = tmp_path / "llm_config.yaml"
+    path.write_text(
+        "llm:\n  api_key: test\n  api_url: http://localhost/v1/chat/completions\n  model: test\n",
+        encoding="utf-8"
+    )
+    return str(path)
+
+
+class TestExtractJsonStr:
+    """LLM响应JSON提取测试"""
+    
+    def test_fenced_json_with_nested_connections(self):
+        """测试代码块中的多层嵌套JSON完整提取"""
+        payload = {
+            "connections": [
+                {"from": "北京", "to": "上海", "meta": {"transport": {"type": "高铁"}}},
+                {"from": "上海", "to": "广州", "meta": {"transport": {"type": "飞机"}}}
+            ],
+            "visual_style": {"theme": "modern"}
+        }
+        response = "路线如下：\n```json\n" + orjson.dumps(payload).decode() + "\n```\n祝旅途愉快"
+        
+        assert orjson.loads(_extract_json_str(response)) == payload
+    
+    def test_braces_and_quotes_inside_strings(self):
+        """测试字符串中的括号和转义引号不影响配对"""
+        payload = {"description": "包含 } 和 { 以及 \"引号\" 与 \\ 反斜杠"}
+        response = "说明 " + orjson.dumps(payload).decode() + " 结束 }"
+        
+        assert orjson.loads(_extract_json_str(response)) == payload
+    
+    def test_plain_json_without_fence(self):
+        """测试无代码块时直接提取"""
+        assert _extract_json_str('  {"locations": []}  ') == '{"locations": []}'
+    
+    def test_unterminated_json(self):
+        """测试JSON不完整时返回剩余文本"""
+        assert _extract_json_str('```json\n{"locations": [') == '{"locations": ['
+
+
+class TestLocationItemScanner:
+    """流式地点对象扫描测试"""
+    
+    def test_items_split_across_chunks(self):
+        """测试对象、字符串和转义字符被切分到不同片段时仍能完整取出"""
+        locations = [
+            {"name": "北京", "display_name": "北京 {首都}", "coordinates": [116.4, 39.9], "type": "city"},
+            {"name": "上海", "display_name": "上海 \"魔都\"", "coordinates": [121.5, 31.2], "type": "city"}
+        ]
+        text = orjson.dumps({"locations": locations}).decode()
+        
+        scanner = _LocationItemScanner()
+        items = []
+        for i in range(0, len(text), 7):
+            items.extend(scanner.feed(text[i:i + 7]))
+        
+        assert [orjson.loads(item) for item in items] == locations
+
+
+class TestJsonModePayload:
+    """JSON模式请求体测试"""
+    
+    @pytest.mark.parametrize("system_prompt", [
+        llm_service_module.LOCATION_PARSING_SYSTEM_PROMPT,
+        llm_service_module.BATCH_LOCATION_PARSING_SYSTEM_PROMPT,
+        llm_service_module.ROUTE_GENERATION_SYSTEM_PROMPT,
+        llm_service_module.ROUTE_PLANNING_SYSTEM_PROMPT,
+    ])
+    @pytest.mark.asyncio
+    async def test_json_prompts_enable_json_mode(self, config_path, system_prompt):
+        """测试各地点和路线提示词都提到JSON并开启JSON模式"""
+        service = LLMService(config_path=config_path)
+        payload = service._build_llm_payload(
+            service._build_location_parsing_prompt("北京到上海"), system_prompt, None
+        )
+        
+        assert payload["response_format"] == {"type": "json_object"}
+        assert any("json" in message["content"].lower() for message in payload["messages"])
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_prompt_without_json_skips_json_mode(self, config_path):
+        """测试消息中未提到JSON时不发送response_format，避免接口返回400"""
+        service = LLMService(config_path=config_path)
+        payload = service._build_llm_payload(
+            "请识别这个地点：北京", llm_service_module.DEFAULT_SYSTEM_PROMPT, None
+        )
+        
+        assert "response_format" not in payload
+        await service.close()
+
+
+class TestRouteCache:
+    """路线生成缓存测试"""
+    
+    @pytest.fixture
+    def service(self, config_path):
+        return LLMService(config_path=config_path)
+    
+    @pytest.mark.asyncio
+    async def test_same_locations_hit_cache(self, service):
+        """测试相同地点列表只调用一次LLM，且返回结果互不影响"""
+        calls = []
+        
+        async def fake_call_llm(prompt, **kwargs):
+            calls.append(prompt)
+            return '{"connections": [{"from": "北京", "to": "上海"}]}'
+        
+        service._call_llm = fake_call_llm
+        locations = [
+            LocationInfo(name="北京", display_name="北京", coordinates=[116.4, 39.9], type="city"),
+            LocationInfo(name="上海", display_name="上海", coordinates=[121.5, 31.2], type="city")
+        ]
+        
+        first = await service.generate_route(locations)
+        first.connections.clear()
+        second = await service.generate_route(locations)
+        
+        assert len(calls) == 1
+        assert second.connections[0]["to"] == "上海"
+        
+        await service.generate_route(list(reversed(locations)))
+        assert len(calls) == 2
+        
+        await service.close()
+
+
+class TestPlanRoute:
+    """一次性路线规划测试"""
+    
+    @pytest.fixture
+    def service(self, config_path):
+        return LLMService(config_path=config_path)
+    
+    @staticmethod
+    def _location(name, lng, lat):
+        return {"name": name, "display_name": name, "coordinates": [lng, lat], "type": "city"}
+    
+    @pytest.mark.asyncio
+    async def test_truncates_and_drops_stale_connections(self, service):
+        """测试地点截断到max_locations，并丢弃指向被截断地点的连接"""
+        calls = []
+        
+        async def fake_call_llm(prompt, **kwargs):
+            calls.append(kwargs["system_prompt"])
+            return orjson.dumps({
+                "locations": [
+                    self._location("北京", 116.4, 39.9),
+                    self._location("上海", 121.5, 31.2),
+                    self._location("广州", 113.3, 23.1)
+                ],
+                "connections": [
+                    {"from": "北京", "to": "上海"},
+                    {"from": "上海", "to": "广州"}
+                ]
+            }).decode()
+        
+        service._call_llm = fake_call_llm
+        locations, route = await service.plan_route("我想去北京、上海和广州", max_locations=2)
+        
+        assert [location.name for location in locations] == ["北京", "上海"]
+        assert [(conn["from"], conn["to"]) for conn in route.connections] == [("北京", "上海")]
+        
+        # 相同输入再次规划时地点和路线都命中缓存
+        _, again_route = await service.plan_route("我想去北京、上海和广州", max_locations=2)
+        assert len(calls) == 1
+        assert again_route.connections == route.connections
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_default_connections(self, service):
+        """测试截断后没有有效连接时为相邻地点生成默认连接"""
+        async def fake_call_llm(prompt, **kwargs):
+            return orjson.dumps({
+                "locations": [
+                    self._location("北京", 116.4, 39.9),
+                    self._location("上海", 121.5, 31.2),
+                    self._location("广州", 113.3, 23.1)
+                ],
+                "connections": [{"from": "上海", "to": "广州"}]
+            }).decode()
+        
+        service._call_llm = fake_call_llm
+        locations, route = await service.plan_route("我想去北京、上海和广州", max_locations=1)
+        
+        assert [location.name for location in locations] == ["北京"]
+        assert route.connections == service._build_default_connections(locations)
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_resolved_input_only_generates_route(self, service):
+        """测试无需LLM即可解析地点时只调用路线生成"""
+        system_prompts = []
+        
+        async def fake_call_llm(prompt, **kwargs):
+            system_prompts.append(kwargs["system_prompt"])
+            return '{"connections": [{"from": "北京", "to": "上海"}]}'
+        
+        service._call_llm = fake_call_llm
+        user_input = orjson.dumps({"locations": [
+            self._location("北京", 116.4, 39.9),
+            self._location("上海", 121.5, 31.2)
+        ]}).decode()
+        
+        locations, route = await service.plan_route(user_input)
+        
+        assert [location.name for location in locations] == ["北京", "上海"]
+        assert system_prompts == [llm_service_module.ROUTE_GENERATION_SYSTEM_PROMPT]
+        await service.close()
+
+
+class TestParseLocationsStream:
+    """流式地点解析测试"""
+    
+    @pytest.mark.asyncio
+    async def test_yields_locations_from_sse(self, config_path):
+        """测试从SSE增量片段中逐个产出地点，并缓存完整结果"""
+        text = orjson.dumps({"locations": [
+            {"name": "北京", "display_name": "北京", "coordinates": [116.4, 39.9], "type": "city"},
+            {"name": "西安", "display_name": "西安", "coordinates": [108.9, 34.3], "type": "city"}
+        ]}).decode()
+        chunks = [text[i:i + 10] for i in range(0, len(text), 10)]
+        body = "".join(
+            "data: " + orjson.dumps({"choices": [{"delta": {"content": chunk}}]}).decode() + "\n\n"
+            for chunk in chunks
+        ) + "data: [DONE]\n\n"
+        
+        requests = []
+        
+        def handler(request):
+            requests.append(orjson.loads(request.content))
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+        
+        service = LLMService(
+            config_path=config_path,
+            client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        )
+        
+        names = [location.name async for location in service.parse_locations_stream("北京到西安")]
+        assert names == ["北京", "西安"]
+        assert requests[0]["stream"] is True
+        
+        cached = [location.name async for location in service.parse_locations_stream("北京到西安")]
+        assert cached == names
+        assert len(requests) == 1
+        
+        await service.close()
+
+
+class TestResolveWithoutLLM:
+    """无需LLM的地点解析测试"""
+    
+    @pytest.fixture
+    def service(self, config_path):
+        service = LLMService(config_path=config_path)
+        
+        async def fail_call_llm(prompt, **kwargs):
+            raise AssertionError("不应调用LLM")
+        
+        service._call_llm = fail_call_llm
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_json_input(self, service):
+        """测试已是地点JSON的输入直接返回"""
+        user_input = orjson.dumps({"locations": [
+            {"name": "北京", "display_name": "北京", "coordinates": [116.4, 39.9], "type": "city"}
+        ]}).decode()
+        
+        locations = await service.parse_locations(user_input)
+        
+        assert [location.name for location in locations] == ["北京"]
+        await service.close()
+    
+    @staticmethod
+    def _geocoding_parser(geocodes):
+        """构建使用模拟高德接口的地名解析器，geocodes为地名到(坐标, 级别)的映射，缺失的地名查无结果"""
+        def handler(request):
+            address = request.url.params["address"]
+            if address not in geocodes:
+                return httpx.Response(200, json={"status": "1", "geocodes": []})
+            location, level = geocodes[address]
+            return httpx.Response(200, json={"status": "1", "geocodes": [
+                {"location": location, "formatted_address": address, "level": level}
+            ]})
+        
+        # 直接设置客户端及其所属事件循环，不经过_get_client创建真实连接池
+        parser = LocationParser()
+        parser._client = httpx.AsyncClient(base_url="http://amap.test", transport=httpx.MockTransport(handler))
+        parser._client_loop = asyncio.get_running_loop()
+        return parser
+    
+    @pytest.mark.asyncio
+    async def test_city_list_geocoded(self, service, monkeypatch):
+        """测试以分隔符隔开的城市名通过地理编码解析"""
+        parser = self._geocoding_parser({"北京": ("116.4,39.9", "市"), "上海": ("121.5,31.2", "市")})
+        monkeypatch.setattr(llm_service_module, "get_location_parser", lambda: parser)
+        
+        locations = await service.parse_locations("帝都 → 上海")
+        
+        assert [location.name for location in locations] == ["北京", "上海"]
+        assert locations[1].coordinates == [121.5, 31.2]
+        await parser.aclose()
+        await service.close()
+    
+    @pytest.mark.parametrize("user_input", ["北京 → 朝阳", "北京 → 火星"])
+    @pytest.mark.asyncio
+    async def test_district_or_unresolved_falls_back_to_llm(self, service, monkeypatch, user_input):
+        """测试任一地名为区县级或查无结果时交由LLM解析"""
+        parser = self._geocoding_parser({"北京": ("116.4,39.9", "市"), "朝阳": ("116.4,39.9", "区县")})
+        monkeypatch.setattr(llm_service_module, "get_location_parser", lambda: parser)
+        calls = []
+        
+        async def fake_call_llm(prompt, **kwargs):
+            calls.append(prompt)
+            return '{"locations": [{"name": "北京", "display_name": "北京", "coordinates": [116.4, 39.9], "type": "city"}]}'
+        
+        service._call_llm = fake_call_llm
+        locations = await service.parse_locations(user_input)
+        
+        assert len(calls) == 1
+        assert [location.name for location in locations] == ["北京"]
+        await parser.aclose()
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_geocoded_result_cached(self, service, monkeypatch):
+        """测试地理编码解析的结果写入地点缓存，重复输入不再地理编码"""
+        parser = self._geocoding_parser({"北京": ("116.4,39.9", "市"), "上海": ("121.5,31.2", "市")})
+        parser_calls = []
+        
+        def get_parser():
+            parser_calls.append(1)
+            return parser
+        
+        monkeypatch.setattr(llm_service_module, "get_location_parser", get_parser)
+        
+        first = await service.parse_locations("北京 上海")
+        second = await service.parse_locations("北京 上海")
+        
+        assert second == first
+        assert len(parser_calls) == 1
+        await parser.aclose()
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_slow_geocoding_falls_back_to_llm(self, service, monkeypatch):
+        """测试地理编码超过总时限时不再等待，改用LLM解析"""
+        release = asyncio.Event()
+        
+        async def handler(request):
+            await release.wait()
+            return httpx.Response(200, json={"status": "1", "geocodes": []})
+        
+        parser = LocationParser()
+        parser._client = httpx.AsyncClient(base_url="http://amap.test", transport=httpx.MockTransport(handler))
+        parser._client_loop = asyncio.get_running_loop()
+        monkeypatch.setattr(llm_service_module, "get_location_parser", lambda: parser)
+        monkeypatch.setattr(llm_service_module, "_RESOLVE_WITHOUT_LLM_TIMEOUT", 0.05)
+        
+        async def fake_call_llm(prompt, **kwargs):
+            return '{"locations": [{"name": "北京", "display_name": "北京", "coordinates": [116.4, 39.9], "type": "city"}]}'
+        
+        service._call_llm = fake_call_llm
+        locations = await service.parse_locations("北京 上海")
+        
+        assert [location.name for location in locations] == ["北京"]
+        # 放行后台的地理编码请求，待其结束后再关闭客户端
+        release.set()
+        await asyncio.gather(*parser._inflight.values())
+        await parser.aclose()
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_batch_does_not_resolve_twice(self, service, monkeypatch):
+        """测试批量解析中无需LLM解析失败的输入直接交给LLM，不再重复尝试"""
+        parser = self._geocoding_parser({"北京": ("116.4,39.9", "市")})
+        monkeypatch.setattr(llm_service_module, "get_location_parser", lambda: parser)
+        resolve = service._resolve_without_llm
+        resolve_calls = []
+        
+        async def counting_resolve(user_input):
+            resolve_calls.append(user_input)
+            return await resolve(user_input)
+        
+        async def fake_call_llm(prompt, **kwargs):
+            return '{"locations": [{"name": "北京", "display_name": "北京", "coordinates": [116.4, 39.9], "type": "city"}]}'
+        
+        service._resolve_without_llm = counting_resolve
+        service._call_llm = fake_call_llm
+        results = await service.parse_locations_batch(["北京 → 火星"])
+        
+        assert resolve_calls == ["北京 → 火星"]
+        assert [location.name for location in results[0]] == ["北京"]
+        await parser.aclose()
+        await service.close()
@@ -1,6 +1,6 @@
 import pytest
 import asyncio
-from app.services.route_generator import RouteGenerator
+from app.services.route_generator import RouteGenerator, LabelSpatialIndex
 from app.models import Coordinate
 
 class TestRouteGenerator:
@@ -99,6 +99,16 @@ class TestRouteGenerator:
         assert len(control_points) >= 2  # 至少2个控制点
         assert len(end_points) == 1  # 1个结束点
     
+    def test_generate_packed_path(self):
+        """测试列式路径点与逐点生成结果一致"""
+        path_points = self.route_generator.generate_path_points(self.test_coordinates)
+        packed = self.route_generator.generate_packed_path(self.test_coordinates)
+        
+        assert packed.lng == [p.lng for p in path_points]
+        assert packed.lat == [p.lat for p in path_points]
+        assert packed.type == [p.type for p in path_points]
+        assert packed.index == [p.index for p in path_points]
+    
     def test_generate_bezier_control_points(self):
         """测试贝塞尔控制点生成"""
         start = self.test_coordinates[0]  # 北京
@@ -127,6 +137,36 @@ class TestRouteGenerator:
             assert label.offset_x is not None
             assert label.offset_y is not None
     
+    def test_label_spatial_index(self):
+        """测试标签索引的重叠检测"""
+        index = LabelSpatialIndex()
+        index.insert({'x': 0.0, 'y': 0.0, 'width': 0.05, 'height': 0.005})
+        index.insert({'x': 1.0, 'y': 0.0, 'width': 0.01, 'height': 0.005})
+        
+        # 左边界在已有框左侧但宽度覆盖到已有框
+        assert index.overlaps({'x': 0.96, 'y': 0.002, 'width': 0.05, 'height': 0.005})
+        # 较宽的框从左侧延伸覆盖
+        assert index.overlaps({'x': 0.04, 'y': 0.002, 'width': 0.01, 'height': 0.005})
+        # x方向相交但y方向错开
+        assert not index.overlaps({'x': 0.0, 'y': 0.01, 'width': 0.05, 'height': 0.005})
+        # 边界恰好相接不算重叠
+        assert not index.overlaps({'x': 0.05, 'y': 0.0, 'width': 0.01, 'height': 0.005})
+    
+    def test_occupied_areas_accepts_bounds_list(self):
+        """测试已占用区域仍可以边界框列表传入"""
+        occupied = [{'x': 0.0, 'y': 0.0, 'width': 0.05, 'height': 0.005}]
+        
+        assert self.route_generator.is_overlapping({'x': 0.04, 'y': 0.002, 'width': 0.01, 'height': 0.005}, occupied)
+        assert not self.route_generator.is_overlapping({'x': 0.05, 'y': 0.0, 'width': 0.01, 'height': 0.005}, occupied)
+        
+        # 上方已被占用时改放其他方位，且不修改传入的列表
+        top = self.route_generator.find_best_label_position(self.test_coordinates[0], [])
+        taken = [self.route_generator.get_label_bounds(top)]
+        label = self.route_generator.find_best_label_position(self.test_coordinates[0], taken)
+        assert top.position == 'top'
+        assert label.position != 'top'
+        assert len(taken) == 1
+    
     def test_calculate_distance(self):
         """测试距离计算"""
         beijing = self.test_coordinates[0]
@@ -7,10 +7,13 @@ import asyncio
 import sys
 import os
 
-# 添加backend目录到Python路径
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+# 添加backend目录到Python路径，与后端服务一致以app为包根导入，
+# 避免同时以app.*和backend.app.*两套模块名重复导入、产生两个服务实例
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
 
-from backend.app.services.llm_service import llm_service
+from app.services.llm_service import LOCATION_PARSING_SYSTEM_PROMPT, get_llm_service
+
+llm_service = get_llm_service()
 
 async def test_llm():
     try:
@@ -20,7 +23,7 @@ async def test_llm():
         print(full_prompt)
         print('\n' + '='*50 + '\n')
         
-        response = await llm_service._call_llm(full_prompt)
+        response = await llm_service._call_llm(full_prompt, system_prompt=LOCATION_PARSING_SYSTEM_PROMPT)
         print('LLM响应内容:')
         print(repr(response))
         print('\n原始响应:')
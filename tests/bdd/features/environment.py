@@ -0,0 +1,27 @@
+"""
+behave环境钩子
+在整个测试运行前后创建和释放步骤共享的事件循环与HTTP客户端，并为每个场景准备独立的测试指标
+"""
+
+import sys
+from pathlib import Path
+
+# 步骤定义位于tests/bdd/step_definitions
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from step_definitions.ai_route_steps import close_test_context, setup_scenario_context, setup_test_context
+
+
+def before_all(context):
+    """测试运行开始前创建共享的事件循环和HTTP客户端"""
+    setup_test_context(context)
+
+
+def before_scenario(context, scenario):
+    """每个场景开始前创建独立的测试指标"""
+    setup_scenario_context(context)
+
+
+def after_all(context):
+    """测试运行结束后关闭共享的HTTP客户端和事件循环"""
+    close_test_context(context)
@@ -5,24 +5,24 @@ AI路线规划BDD测试步骤定义
 
 import asyncio
 import json
+import os
 import time
+from types import MappingProxyType
 from typing import Dict, List, Any
 import pytest
 from behave import given, when, then, step
 from behave.runner import Context
 import httpx
-from PIL import Image
-import numpy as np
 
 # 测试配置
 TEST_BASE_URL = "http://localhost:8000"
 TEST_TIMEOUT = 30
-PERFORMANCE_THRESHOLDS = {
+PERFORMANCE_THRESHOLDS = MappingProxyType({
     "llm_parse_time": 5.0,
     "route_generation_time": 3.0,
     "visual_rendering_time": 2.0,
     "total_response_time": 10.0
-}
+})
 
 class TestMetrics:
     """测试指标收集器"""
@@ -36,35 +36,59 @@ class TestMetrics:
         self.image_quality_metrics = {}
 
     def start_timer(self):
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
 
     def record_step_time(self, step_name: str):
         if self.start_time:
-            setattr(self, f"{step_name}_time", time.time() - self.start_time)
+            setattr(self, f"{step_name}_time", time.perf_counter() - self.start_time)
 
     def get_total_time(self):
         if self.start_time:
-            self.total_time = time.time() - self.start_time
+            self.total_time = time.perf_counter() - self.start_time
         return self.total_time
 
-# 全局测试上下文
-test_metrics = TestMetrics()
+async def _check_health(client: httpx.AsyncClient) -> Dict[str, Any]:
+    """请求健康检查接口并验证服务状态"""
+    response = await client.get("/api/v1/ai/health")
+    assert response.status_code == 200
+    health_data = response.json()
+    assert health_data["status"] == "healthy"
+    return health_data
+
+def setup_test_context(context: Context):
+    """
+    创建整个测试运行共享的事件循环和HTTP客户端，由behave的before_all调用
+
+    所有步骤在同一个事件循环上执行，客户端的连接池始终绑定在这个循环上，场景之间复用keep-alive连接；
+    健康检查结果在整个运行中基本不变，这里只请求一次
+    """
+    context.loop = asyncio.new_event_loop()
+    context.client = httpx.AsyncClient(
+        base_url=TEST_BASE_URL,
+        timeout=TEST_TIMEOUT,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+    )
+    context.backend_health = context.loop.run_until_complete(_check_health(context.client))
+
+def setup_scenario_context(context: Context):
+    """为每个场景创建独立的测试指标，由behave的before_scenario调用"""
+    context.test_metrics = TestMetrics()
+
+def close_test_context(context: Context):
+    """关闭共享的HTTP客户端和事件循环，由behave的after_all调用"""
+    context.loop.run_until_complete(context.client.aclose())
+    context.loop.close()
 
 @given('系统已启动并运行在 "{base_url}"')
 def step_system_running(context: Context, base_url: str):
     """验证系统是否正常运行"""
     context.base_url = base_url
-    context.client = httpx.AsyncClient(base_url=base_url, timeout=TEST_TIMEOUT)
     
-    # 健康检查
-    async def check_health():
-        response = await context.client.get("/api/v1/ai/health")
-        assert response.status_code == 200
-        health_data = response.json()
-        assert health_data["status"] == "healthy"
-        return health_data
-    
-    context.health_data = asyncio.run(check_health())
+    # 默认复用before_all中的健康检查结果，调试时设置 BDD_FORCE_HEALTH=1 每个场景重新检查
+    if os.environ.get("BDD_FORCE_HEALTH") == "1":
+        context.health_data = context.loop.run_until_complete(_check_health(context.client))
+    else:
+        context.health_data = context.backend_health
     print(f"✅ 系统健康检查通过: {context.health_data}")
 
 @given('LLM服务已正确配置')
@@ -97,7 +121,7 @@ def step_user_input(context: Context, user_input: str):
     if "北京" in user_input and "上海" in user_input and "广州" in user_input:
         context.expected_locations = ["北京", "上海", "广州"]
     
-    test_metrics.start_timer()
+    context.test_metrics.start_timer()
     print(f"📝 用户输入: {user_input}")
 
 @when('用户点击生成路线按钮')
@@ -106,33 +130,38 @@ def step_generate_route_button(context: Context):
     context.route_generation_started = True
     print("🖱️ 用户点击生成路线按钮")
 
+async def _parse_locations(context: Context) -> Dict[str, Any]:
+    """调用地点解析接口并记录解析结果"""
+    request_data = {
+        "input_text": context.user_input,
+        "max_locations": 8
+    }
+    
+    response = await context.client.post(
+        "/api/v1/ai/parse-locations",
+        json=request_data
+    )
+    
+    assert response.status_code == 200
+    parse_result = response.json()
+    
+    # 验证解析结果结构
+    assert "locations" in parse_result
+    assert isinstance(parse_result["locations"], list)
+    
+    context.parsed_locations = parse_result["locations"]
+    context.test_metrics.record_step_time("llm_parse")
+    
+    return parse_result
+
 @then('系统应该调用LLM服务解析地点')
 def step_llm_parse_locations(context: Context):
     """验证LLM地点解析"""
-    async def parse_locations():
-        request_data = {
-            "input_text": context.user_input,
-            "max_locations": 8
-        }
-        
-        response = await context.client.post(
-            "/api/v1/ai/parse-locations",
-            json=request_data
-        )
-        
-        assert response.status_code == 200
-        parse_result = response.json()
-        
-        # 验证解析结果结构
-        assert "locations" in parse_result
-        assert isinstance(parse_result["locations"], list)
-        
-        context.parsed_locations = parse_result["locations"]
-        test_metrics.record_step_time("llm_parse")
-        
-        return parse_result
-    
-    context.parse_result = asyncio.run(parse_locations())
+    # 同一场景中已解析过时直接复用结果（如先执行了完整流程再验证耗时）
+    if getattr(context, "parse_result", None) is not None:
+        return
+    
+    context.parse_result = context.loop.run_until_complete(_parse_locations(context))
     print(f"🧠 LLM解析完成，识别到 {len(context.parsed_locations)} 个地点")
 
 @then('应该识别出{expected_count:d}个有效地点')
@@ -142,36 +171,40 @@ def step_verify_location_count(context: Context, expected_count: int):
     assert actual_count == expected_count, f"期望 {expected_count} 个地点，实际识别 {actual_count} 个"
     print(f"✅ 地点数量验证通过: {actual_count} 个")
 
+async def _generate_route(context: Context) -> Dict[str, Any]:
+    """调用路线生成接口并记录路线数据"""
+    request_data = {
+        "user_input": context.user_input,
+        "max_locations": 8
+    }
+    
+    response = await context.client.post(
+        "/api/v1/ai/generate-route",
+        json=request_data
+    )
+    
+    assert response.status_code == 200
+    route_result = response.json()
+    
+    # 验证路线结构
+    assert "route" in route_result
+    route_data = route_result["route"]
+    assert "locations" in route_data
+    assert "connections" in route_data
+    assert "visual_style" in route_data
+    
+    context.route_data = route_data
+    context.test_metrics.record_step_time("route_generation")
+    
+    return route_result
+
 @then('应该生成优化的路线连接')
 def step_generate_route_connections(context: Context):
     """生成路线连接"""
-    async def generate_route():# 构建路线生成请求
-        request_data = {
-            "user_input": context.user_input,
-            "max_locations": 8
-        }
-        
-        response = await context.client.post(
-            "/api/v1/ai/generate-route",
-            json=request_data
-        )
-        
-        assert response.status_code == 200
-        route_result = response.json()
-        
-        # 验证路线结构
-        assert "route" in route_result
-        route_data = route_result["route"]
-        assert "locations" in route_data
-        assert "connections" in route_data
-        assert "visual_style" in route_data
-        
-        context.route_data = route_data
-        test_metrics.record_step_time("route_generation")
-        
-        return route_result
-    
-    context.route_result = asyncio.run(generate_route())
+    if getattr(context, "route_result", None) is not None:
+        return
+    
+    context.route_result = context.loop.run_until_complete(_generate_route(context))
     print(f"🛣️ 路线生成完成，包含 {len(context.route_data['connections'])} 个连接")
 
 @then('应该渲染出完整的路线图')
@@ -179,6 +212,8 @@ def step_render_route_map(context: Context):
     """渲染路线图"""
     # 这里模拟视觉渲染过程
     # 在实际实现中，这可能涉及Canvas渲染或图像生成
+    if getattr(context, "rendered_image", None) is not None:
+        return
     
     route_data = context.route_data
     
@@ -187,8 +222,11 @@ def step_render_route_map(context: Context):
     assert "connections" in route_data
     assert "visual_style" in route_data
     
-    # 模拟渲染时间
-    time.sleep(0.5)  # 模拟渲染延迟
+    # 默认不模拟渲染延迟；需要时通过 behave -D simulate_render_latency=0.5 指定秒数，
+    # 在共享事件循环上等待而不是阻塞线程
+    render_latency = float(context.config.userdata.get("simulate_render_latency", 0))
+    if render_latency > 0:
+        context.loop.run_until_complete(asyncio.sleep(render_latency))
     
     # 创建模拟的图像质量指标
     context.rendered_image = {
@@ -200,7 +238,7 @@ def step_render_route_map(context: Context):
         "connections_rendered": len(route_data["connections"])
     }
     
-    test_metrics.record_step_time("visual_rendering")
+    context.test_metrics.record_step_time("visual_rendering")
     print("🎨 路线图渲染完成")
 
 @then('图像应该包含所有地点标记')
@@ -233,15 +271,30 @@ def step_verify_smooth_curves(context: Context):
 def step_user_input_format(context: Context, input_format: str):
     """处理不同格式的用户输入"""
     context.user_input = input_format
-    test_metrics.start_timer()
+    context.test_metrics.start_timer()
     print(f"📝 用户输入格式: {input_format}")
 
 @then('系统应该正确解析并生成路线图')
 def step_parse_and_generate_route(context: Context):
     """完整的解析和生成流程"""
-    # 组合之前定义的步骤
-    step_llm_parse_locations(context)
-    step_generate_route_connections(context)
+    # 路线生成接口直接接收用户输入，不依赖解析结果，两个请求并发发出；
+    # 渲染依赖路线数据，仍在之后执行
+    endpoint_times = {}
+    
+    async def timed(name: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            endpoint_times[name] = time.perf_counter() - start
+    
+    context.parse_result, context.route_result = context.loop.run_until_complete(asyncio.gather(
+        timed("parse_locations", _parse_locations(context)),
+        timed("generate_route", _generate_route(context))
+    ))
+    context.endpoint_times = endpoint_times
+    print("⏱️ 接口耗时: " + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in endpoint_times.items()))
+    
     step_render_route_map(context)
     print("✅ 完整路线生成流程验证通过")
 
@@ -292,7 +345,7 @@ def step_complex_route_input(context: Context, city_count: int):
     cities = ["北京", "上海", "广州", "深圳", "杭州", "南京", "西安", "成都"]
     context.user_input = " ".join(cities[:city_count])
     context.expected_city_count = city_count
-    test_metrics.start_timer()
+    context.test_metrics.start_timer()
     print(f"📝 复杂路线输入: {city_count} 个城市")
 
 @when('系统处理路线生成请求')
@@ -307,7 +360,7 @@ def step_verify_llm_parse_time(context: Context, max_time: float):
     # 执行LLM解析
     step_llm_parse_locations(context)
     
-    actual_time = test_metrics.llm_parse_time
+    actual_time = context.test_metrics.llm_parse_time
     assert actual_time <= max_time, f"LLM解析时间 {actual_time:.2f}s 超过限制 {max_time}s"
     print(f"⏱️ LLM解析时间: {actual_time:.2f}s (限制: {max_time}s)")
 
@@ -316,7 +369,7 @@ def step_verify_route_generation_time(context: Context, max_time: float):
     """验证路线生成时间"""
     step_generate_route_connections(context)
     
-    actual_time = test_metrics.route_generation_time
+    actual_time = context.test_metrics.route_generation_time
     assert actual_time <= max_time, f"路线生成时间 {actual_time:.2f}s 超过限制 {max_time}s"
     print(f"⏱️ 路线生成时间: {actual_time:.2f}s (限制: {max_time}s)")
 
@@ -325,26 +378,22 @@ def step_verify_visual_rendering_time(context: Context, max_time: float):
     """验证视觉渲染时间"""
     step_render_route_map(context)
     
-    actual_time = test_metrics.visual_rendering_time
+    actual_time = context.test_metrics.visual_rendering_time
     assert actual_time <= max_time, f"视觉渲染时间 {actual_time:.2f}s 超过限制 {max_time}s"
     print(f"⏱️ 视觉渲染时间: {actual_time:.2f}s (限制: {max_time}s)")
 
 @then('总体响应时间应该在{max_time:g}秒内')
 def step_verify_total_response_time(context: Context, max_time: float):
     """验证总体响应时间"""
-    total_time = test_metrics.get_total_time()
+    total_time = context.test_metrics.get_total_time()
     assert total_time <= max_time, f"总体响应时间 {total_time:.2f}s 超过限制 {max_time}s"
     print(f"⏱️ 总体响应时间: {total_time:.2f}s (限制: {max_time}s)")
 
 # 清理函数
 def cleanup_test_context(context: Context):
-    """清理测试上下文"""
-    if hasattr(context, 'client'):
-        asyncio.run(context.client.aclose())
-    
+    """清理测试上下文（共享的HTTP客户端在after_all中统一关闭）"""
     # 重置测试指标
-    global test_metrics
-    test_metrics = TestMetrics()
+    context.test_metrics = TestMetrics()
 
 # 在测试结束后调用清理
 @step('清理测试环境')